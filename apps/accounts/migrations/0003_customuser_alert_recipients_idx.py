@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_customuser_city_ref"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                fields=["city_ref", "notifications_enabled"],
+                name="user_alert_recipients_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_counts(apps, schema_editor):
+    CustomUser = apps.get_model("accounts", "CustomUser")
+    UserAlert = apps.get_model("dashboard", "UserAlert")
+    unread = (
+        UserAlert.objects.filter(user=OuterRef("pk"), is_read=False)
+        .order_by()
+        .values("user")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    CustomUser.objects.update(unread_alert_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_customuser_alert_recipients_idx"),
+        ("dashboard", "0011_useralert_inbox_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="unread_alert_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
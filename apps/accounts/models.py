@@ -27,6 +27,9 @@ class CustomUser(AbstractUser):
 
     # Custom fields (as you defined them)
     city = models.CharField(max_length=100, blank=True, null=True)
+    city_ref = models.ForeignKey(
+        'dashboard.City', on_delete=models.SET_NULL, null=True, blank=True, related_name='residents'
+    )
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     preferred_units = models.CharField(
         max_length=10, 
@@ -34,9 +37,28 @@ class CustomUser(AbstractUser):
         default='metric'
     )
     notifications_enabled = models.BooleanField(default=True)
+    # Denormalized count of unread UserAlerts for the navbar badge, kept in
+    # step by alert fan-out and mark-as-read (reconcile_alert_counts repairs drift)
+    unread_alert_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Alert fan-out selects a city's residents who want notifications
+            models.Index(fields=['city_ref', 'notifications_enabled'], name='user_alert_recipients_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Keep the canonical city in step with the free-text one
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'city' in update_fields:
+            from apps.dashboard.models import resolve_city
+            self.city_ref = resolve_city(self.city)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'city_ref'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.username
 
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+MODELS = [("community", "CommunityReport")]
+
+
+def city_for(City, CityAlias, raw_name):
+    """Historical-model version of CityRegistry.resolve"""
+    normalized = " ".join((raw_name or "").split()).casefold()
+    if not normalized:
+        return None
+    city = City.objects.filter(normalized_name=normalized).first()
+    if city is None:
+        alias = CityAlias.objects.filter(alias=normalized).first()
+        city = alias.city if alias else None
+    if city is None:
+        city = City.objects.create(
+            normalized_name=normalized, name=" ".join(raw_name.split())
+        )
+    return city
+
+
+def backfill_city_refs(apps, schema_editor):
+    City = apps.get_model("dashboard", "City")
+    CityAlias = apps.get_model("dashboard", "CityAlias")
+    for app_label, model_name in MODELS:
+        Model = apps.get_model(app_label, model_name)
+        # One UPDATE per distinct spelling rather than one per row
+        raw_names = (
+            Model.objects.filter(city_ref__isnull=True)
+            .exclude(city__isnull=True)
+            .order_by()
+            .values_list("city", flat=True)
+            .distinct()
+        )
+        for raw_name in list(raw_names):
+            city = city_for(City, CityAlias, raw_name)
+            if city is not None:
+                Model.objects.filter(city=raw_name, city_ref__isnull=True).update(
+                    city_ref=city
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0003_city_foreign_keys"),
+        ("community", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="communityreport",
+            name="city_ref",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="community_reports",
+                to="dashboard.city",
+            ),
+        ),
+        migrations.RunPython(backfill_city_refs, migrations.RunPython.noop),
+    ]
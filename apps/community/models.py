@@ -34,6 +34,9 @@ class CommunityReport(models.Model):
     description = models.TextField()
     location = models.CharField(max_length=200)
     city = models.CharField(max_length=100)
+    city_ref = models.ForeignKey(
+        'dashboard.City', on_delete=models.SET_NULL, null=True, blank=True, related_name='community_reports'
+    )
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     severity = models.CharField(max_length=20, choices=SEVERITY_LEVELS, default='medium')
@@ -48,6 +51,12 @@ class CommunityReport(models.Model):
     class Meta:
         ordering = ['-created_at']
     
+    def save(self, *args, **kwargs):
+        # Keep the canonical city in step with the free-text one
+        from apps.dashboard.models import resolve_city
+        self.city_ref = resolve_city(self.city)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.title} - {self.city}"
     
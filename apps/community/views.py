@@ -7,6 +7,8 @@ from django.core.paginator import Paginator
 from django.db.models import Q
 import json
 
+from apps.dashboard.cities import CityRegistry
+
 from .models import CommunityReport, ReportVote, ReportComment, CommunityChallenge, ChallengeParticipation
 from .forms import CommunityReportForm, ReportCommentForm
 
@@ -28,7 +30,7 @@ def community_reports(request):
         reports = reports.filter(report_type=report_type)
     
     if city:
-        reports = reports.filter(city__icontains=city)
+        reports = CityRegistry.filter(reports, city)
     
     if severity != 'all':
         reports = reports.filter(severity=severity)
@@ -232,18 +234,17 @@ def analytics(request):
     """Community analytics dashboard"""
     user_city = request.user.city or 'Chennai'
     
+    city_reports = CityRegistry.filter(CommunityReport.objects.all(), user_city)
+    
     # Get analytics data
-    total_reports = CommunityReport.objects.filter(city__icontains=user_city).count()
-    pending_reports = CommunityReport.objects.filter(city__icontains=user_city, status='pending').count()
-    resolved_reports = CommunityReport.objects.filter(city__icontains=user_city, status='resolved').count()
+    total_reports = city_reports.count()
+    pending_reports = city_reports.filter(status='pending').count()
+    resolved_reports = city_reports.filter(status='resolved').count()
     
     # Report types distribution
     report_types_data = []
     for report_type, label in CommunityReport.REPORT_TYPES:
-        count = CommunityReport.objects.filter(
-            city__icontains=user_city, 
-            report_type=report_type
-        ).count()
+        count = city_reports.filter(report_type=report_type).count()
         if count > 0:
             report_types_data.append({
                 'type': label,
@@ -254,10 +255,7 @@ def analytics(request):
     # Severity distribution
     severity_data = []
     for severity, label in CommunityReport.SEVERITY_LEVELS:
-        count = CommunityReport.objects.filter(
-            city__icontains=user_city,
-            severity=severity
-        ).count()
+        count = city_reports.filter(severity=severity).count()
         if count > 0:
             severity_data.append({
                 'severity': label,
@@ -266,9 +264,7 @@ def analytics(request):
             })
     
     # Recent activity
-    recent_reports = CommunityReport.objects.filter(
-        city__icontains=user_city
-    ).order_by('-created_at')[:10]
+    recent_reports = city_reports.order_by('-created_at')[:10]
     
     context = {
         'user_city': user_city,
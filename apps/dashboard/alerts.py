@@ -0,0 +1,124 @@
+"""City-wide UserAlert fan-out and per-user inbox bookkeeping.
+
+Recipients come from one query on the (city_ref, notifications_enabled)
+index, and alerts are written with chunked ``bulk_create`` inside a single
+transaction, so alerting a whole city costs a handful of statements rather
+than one INSERT per resident.
+
+Each user's unread alerts are also counted on ``CustomUser.unread_alert_count``
+so the navbar badge needs no query. Every path that creates or reads alerts
+moves the counter with an atomic ``F()`` update in the same transaction.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import pagination
+from .broadcast import Broadcaster
+from .models import UserAlert
+
+logger = logging.getLogger(__name__)
+
+
+class AlertFanout:
+
+    @classmethod
+    def send(cls, city_id, alert_type, message, severity='warning', dedupe_key='', cooldown=None):
+        """Create one alert for every active resident of a city who wants notifications.
+
+        With a ``dedupe_key``, residents who already got an alert with that key
+        in the last ``cooldown`` seconds (ALERT_FANOUT['cooldown_seconds'] by
+        default) are skipped. Returns a report with the number of alerts
+        created and how long the fan-out took.
+        """
+        options = settings.ALERT_FANOUT
+        started = time.monotonic()
+        recipients = get_user_model().objects.filter(
+            city_ref_id=city_id, notifications_enabled=True, is_active=True
+        )
+        if dedupe_key:
+            if cooldown is None:
+                cooldown = options['cooldown_seconds']
+            recent = UserAlert.objects.filter(
+                dedupe_key=dedupe_key, created_at__gte=timezone.now() - timedelta(seconds=cooldown)
+            )
+            recipients = recipients.exclude(pk__in=recent.values('user_id'))
+
+        created = 0
+        with transaction.atomic():
+            user_ids = list(recipients.values_list('pk', flat=True))
+            for start in range(0, len(user_ids), options['batch_size']):
+                alerts = [
+                    UserAlert(
+                        user_id=user_id,
+                        alert_type=alert_type,
+                        message=message,
+                        severity=severity,
+                        dedupe_key=dedupe_key
+                    )
+                    for user_id in user_ids[start:start + options['batch_size']]
+                ]
+                UserAlert.objects.bulk_create(alerts)
+                get_user_model().objects.filter(pk__in=[alert.user_id for alert in alerts]).update(
+                    unread_alert_count=F('unread_alert_count') + 1
+                )
+                created += len(alerts)
+            if user_ids:
+                transaction.on_commit(
+                    lambda: Broadcaster.publish_alert(user_ids, alert_type, message, severity)
+                )
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if created:
+            logger.info(f"Fanned out {created} {alert_type} alerts to city {city_id} in {elapsed_ms:.0f}ms")
+        return {'created': created, 'elapsed_ms': round(elapsed_ms, 1)}
+
+
+class AlertInbox:
+
+    @classmethod
+    def mark_read(cls, user, alert_ids=None, up_to=None):
+        """Mark the user's alerts read in one UPDATE; returns how many were unread.
+
+        ``alert_ids`` limits it to those alerts; ``up_to`` is an inbox cursor,
+        and marks that alert and every older one.
+        """
+        alerts = UserAlert.objects.filter(user=user, is_read=False)
+        if alert_ids is not None:
+            alerts = alerts.filter(pk__in=alert_ids)
+        if up_to is not None:
+            alerts = pagination.before_cursor(alerts, up_to, 'created_at', inclusive=True)
+        with transaction.atomic():
+            marked = alerts.update(is_read=True)
+            if marked:
+                get_user_model().objects.filter(pk=user.pk).update(
+                    unread_alert_count=Greatest(F('unread_alert_count') - marked, 0)
+                )
+        return marked
+
+    @classmethod
+    def reconcile(cls, dry_run=False):
+        """Reset drifted unread counters from the alerts table; returns the number of users fixed"""
+        unread = (
+            UserAlert.objects.filter(user=OuterRef('pk'), is_read=False)
+            .order_by()
+            .values('user')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        actual = Coalesce(Subquery(unread), 0)
+        drifted = get_user_model().objects.annotate(actual=actual).exclude(unread_alert_count=F('actual'))
+        if dry_run:
+            return drifted.count()
+        with transaction.atomic():
+            user_ids = list(drifted.values_list('pk', flat=True))
+            if user_ids:
+                get_user_model().objects.filter(pk__in=user_ids).update(unread_alert_count=actual)
+        return len(user_ids)
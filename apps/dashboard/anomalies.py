@@ -0,0 +1,141 @@
+"""Online spike detection over incoming observations.
+
+Each city and metric keeps an exponentially weighted mean and variance
+(``MetricBaseline``). Every new reading is scored against the baseline
+before being folded into it, so each reading costs O(1) and history is
+never rescanned.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .alerts import AlertFanout
+from .models import MetricBaseline
+
+logger = logging.getLogger(__name__)
+
+# metric -> (alert type, unit, label)
+METRICS = {
+    'rainfall': ('weather', 'mm', 'rainfall'),
+    'pressure_drop': ('weather', 'hPa', 'pressure drop'),
+    'wind_speed': ('weather', 'm/s', 'wind speed'),
+    'aqi': ('air_quality', '', 'AQI'),
+}
+
+
+def _weather_values(observation, baselines):
+    yield 'rainfall', observation.rainfall
+    yield 'wind_speed', observation.wind_speed
+    # Falling pressure signals approaching storms; the baseline tracks
+    # drops between readings and remembers the last raw pressure
+    baseline = baselines['pressure_drop']
+    previous, baseline.last_value = baseline.last_value, observation.pressure
+    if previous is not None and observation.pressure is not None:
+        yield 'pressure_drop', previous - observation.pressure
+
+
+def _air_quality_values(observation, baselines):
+    yield 'aqi', observation.aqi
+
+
+class AnomalyDetector:
+
+    @classmethod
+    def observe(cls, weather=(), air_quality=()):
+        """Score new readings against their baselines, update them, and alert on spikes.
+
+        Returns the number of UserAlert rows created.
+        """
+        readings = [
+            (observation, values)
+            for observations, values in ((weather, _weather_values), (air_quality, _air_quality_values))
+            for observation in observations
+            if observation.city_ref_id is not None
+        ]
+        if not readings:
+            return 0
+
+        options = settings.ANOMALY_DETECTION
+        now = timezone.now()
+        city_ids = {observation.city_ref_id for observation, _ in readings}
+        with transaction.atomic():
+            baselines = cls._lock_baselines(city_ids)
+            anomalies = []
+            for observation, values in sorted(readings, key=lambda reading: reading[0].recorded_at):
+                city_baselines = baselines[observation.city_ref_id]
+                for metric, value in values(observation, city_baselines):
+                    if value is None:
+                        continue
+                    baseline = city_baselines[metric]
+                    score = cls._score(baseline, value, options)
+                    typical = (baseline.mean, baseline.variance ** 0.5)
+                    cls._update(baseline, value, options['alpha'])
+                    if score is None:
+                        continue
+                    recent = baseline.last_alert_at and now - baseline.last_alert_at < timedelta(
+                        seconds=options['cooldown_seconds']
+                    )
+                    if not recent:
+                        baseline.last_alert_at = now
+                        anomalies.append((observation, metric, value, typical, score))
+
+            MetricBaseline.objects.bulk_update(
+                [baseline for city_baselines in baselines.values() for baseline in city_baselines.values()],
+                ['mean', 'variance', 'count', 'last_value', 'last_alert_at', 'updated_at'],
+                batch_size=500
+            )
+            return cls._alert(anomalies, options) if anomalies else 0
+
+    @classmethod
+    def _score(cls, baseline, value, options):
+        """Standard score of ``value`` if it's an upward spike worth alerting on, else None"""
+        if baseline.count < options['min_samples'] or value < options['floors'].get(baseline.metric, 0):
+            return None
+        spread = max(baseline.variance ** 0.5, options['min_spread'].get(baseline.metric, 1e-9))
+        score = (value - baseline.mean) / spread
+        return score if score >= options['z_threshold'] else None
+
+    @classmethod
+    def _update(cls, baseline, value, alpha):
+        # Exponentially weighted mean and variance (West's incremental form)
+        if baseline.count == 0:
+            baseline.mean, baseline.variance = value, 0.0
+        else:
+            difference = value - baseline.mean
+            increment = alpha * difference
+            baseline.mean += increment
+            baseline.variance = (1 - alpha) * (baseline.variance + difference * increment)
+        baseline.count += 1
+        baseline.updated_at = timezone.now()
+
+    @classmethod
+    def _lock_baselines(cls, city_ids):
+        """Baselines for every metric of the given cities, created if missing and locked for update"""
+        MetricBaseline.objects.bulk_create(
+            [MetricBaseline(city_id=city_id, metric=metric) for city_id in city_ids for metric in METRICS],
+            ignore_conflicts=True
+        )
+        baselines = {city_id: {} for city_id in city_ids}
+        for baseline in MetricBaseline.objects.select_for_update().filter(city_id__in=city_ids):
+            if baseline.metric in METRICS:
+                baselines[baseline.city_id][baseline.metric] = baseline
+        return baselines
+
+    @classmethod
+    def _alert(cls, anomalies, options):
+        """Alert every resident who wants notifications about each anomaly"""
+        created = 0
+        for observation, metric, value, (mean, spread), score in anomalies:
+            alert_type, unit, label = METRICS[metric]
+            severity = 'danger' if score >= 2 * options['z_threshold'] else 'warning'
+            message = (
+                f"Unusual {label} in {observation.city}: {value:.1f}{' ' + unit if unit else ''}, "
+                f"typically {mean:.1f} ± {spread:.1f}"
+            )
+            logger.info(f"Anomaly for {observation.city} {metric}: {value:.1f} (z={score:.1f})")
+            # The baseline's last_alert_at already rate-limits each metric
+            created += AlertFanout.send(observation.city_ref_id, alert_type, message, severity)['created']
+        return created
@@ -4,19 +4,33 @@ from . import views
 urlpatterns = [
     # Dashboard data API
     path('dashboard-data/', views.get_dashboard_data, name='api_dashboard_data'),
+    path('dashboard/stream/', views.dashboard_stream, name='api_dashboard_stream'),
     
     # Weather API endpoints
     path('weather/<str:city>/', views.get_weather_data, name='api_weather_data'),
     path('forecast/<str:city>/', views.get_forecast_data, name='api_forecast_data'),
+    path('weather/history/<str:city>/', views.get_weather_history, name='api_weather_history'),
     
     # Air Quality API endpoints  
     path('air-quality/<str:city>/', views.get_air_quality_data, name='api_air_quality_data'),
     path('air-quality/history/<str:city>/', views.get_air_quality_history, name='api_air_quality_history'),
     
+    # Last-day sparklines, served from per-worker memory
+    path('sparklines/weather/<str:city>/', views.get_weather_sparkline, name='api_weather_sparkline'),
+    path('sparklines/air-quality/<str:city>/', views.get_air_quality_sparkline, name='api_air_quality_sparkline'),
+    
+    # History exports (streamed NDJSON / CSV)
+    path('export/weather/<str:city>/', views.export_weather_history, name='api_export_weather'),
+    path('export/air-quality/<str:city>/', views.export_air_quality_history, name='api_export_air_quality'),
+    
     # Water levels API endpoints
     path('water-levels/', views.get_water_levels, name='api_water_levels'),
     path('water-levels/<str:city>/', views.get_city_water_levels, name='api_city_water_levels'),
     
+    # Alert inbox
+    path('alerts/', views.get_alerts, name='api_alerts'),
+    path('alerts/acknowledge/', views.acknowledge_alerts, name='api_acknowledge_alerts'),
+    
     # User API endpoints
     path('user/location/', views.update_user_location, name='api_update_location'),
     
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.dashboard"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from monsoon_tracker.db import configure_sqlite
+
+        connection_created.connect(configure_sqlite, dispatch_uid='configure_sqlite')
@@ -0,0 +1,111 @@
+"""Breakpoint-based AQI computed over whole arrays of readings at once.
+
+Uses the US EPA breakpoint tables, which the AQI categories on
+``AirQualityData`` follow. Concentrations are in µg/m³ for every pollutant;
+the EPA gas breakpoints (ppb/ppm) are converted at 25 °C and 1 atm.
+"""
+import numpy as np
+
+POLLUTANTS = ('pm25', 'pm10', 'o3', 'no2', 'so2', 'co')
+
+# Litres per mole of an ideal gas at 25 °C and 1 atm
+MOLAR_VOLUME = 24.45
+
+MOLECULAR_WEIGHTS = {
+    'o3': 48.00,
+    'no2': 46.01,
+    'so2': 64.07,
+    'co': 28.01,
+}
+
+INDEX_BREAKPOINTS = [(0, 50), (51, 100), (101, 150), (151, 200), (201, 300), (301, 400), (401, 500)]
+
+# Concentration ranges in the EPA's native units, one per index range above
+_EPA_BREAKPOINTS = {
+    'pm25': ('µg/m³', [(0.0, 12.0), (12.1, 35.4), (35.5, 55.4), (55.5, 150.4),
+                       (150.5, 250.4), (250.5, 350.4), (350.5, 500.4)]),
+    'pm10': ('µg/m³', [(0, 54), (55, 154), (155, 254), (255, 354),
+                       (355, 424), (425, 504), (505, 604)]),
+    # 8-hour ozone up to 300, 1-hour ozone above
+    'o3': ('ppb', [(0, 54), (55, 70), (71, 85), (86, 105),
+                   (106, 200), (405, 504), (505, 604)]),
+    'no2': ('ppb', [(0, 53), (54, 100), (101, 360), (361, 649),
+                    (650, 1249), (1250, 1649), (1650, 2049)]),
+    'so2': ('ppb', [(0, 35), (36, 75), (76, 185), (186, 304),
+                    (305, 604), (605, 804), (805, 1004)]),
+    'co': ('ppm', [(0.0, 4.4), (4.5, 9.4), (9.5, 12.4), (12.5, 15.4),
+                   (15.5, 30.4), (30.5, 40.4), (40.5, 50.4)]),
+}
+
+
+def to_micrograms(pollutant, value, unit):
+    """Convert a concentration to µg/m³; returns None for unknown units"""
+    if value is None:
+        return None
+    unit = (unit or 'µg/m³').replace('ug', 'µg').replace('m3', 'm³').lower()
+    if unit == 'µg/m³':
+        return float(value)
+    if unit == 'mg/m³':
+        return float(value) * 1000
+    if pollutant in MOLECULAR_WEIGHTS:
+        factor = MOLECULAR_WEIGHTS[pollutant] / MOLAR_VOLUME
+        if unit == 'ppb':
+            return float(value) * factor
+        if unit == 'ppm':
+            return float(value) * factor * 1000
+    return None
+
+
+def _build_tables():
+    tables = {}
+    for pollutant, (unit, ranges) in _EPA_BREAKPOINTS.items():
+        ranges = np.array(ranges, dtype=float)
+        if unit == 'ppb':
+            ranges *= MOLECULAR_WEIGHTS[pollutant] / MOLAR_VOLUME
+        elif unit == 'ppm':
+            ranges *= MOLECULAR_WEIGHTS[pollutant] / MOLAR_VOLUME * 1000
+        index = np.array(INDEX_BREAKPOINTS, dtype=float)
+        tables[pollutant] = (ranges[:, 0], ranges[:, 1], index[:, 0], index[:, 1])
+    return tables
+
+
+BREAKPOINTS = _build_tables()
+
+
+def sub_index(pollutant, concentrations):
+    """Sub-index for each concentration; NaN where the concentration is missing"""
+    c_lo, c_hi, i_lo, i_hi = BREAKPOINTS[pollutant]
+    c = np.clip(np.asarray(concentrations, dtype=float), 0, c_hi[-1])
+
+    # First range whose upper bound covers the value; values falling in the
+    # small gaps between ranges are clipped onto the next range's lower bound
+    tier = np.minimum(np.searchsorted(c_hi, c, side='left'), len(c_hi) - 1)
+    c = np.maximum(c, c_lo[tier])
+    return (i_hi[tier] - i_lo[tier]) / (c_hi[tier] - c_lo[tier]) * (c - c_lo[tier]) + i_lo[tier]
+
+
+def compute(concentrations):
+    """AQI and dominant pollutant for arrays of readings.
+
+    ``concentrations`` maps pollutant names to equal-length arrays (None or
+    NaN for missing readings). Returns ``(aqi, dominant)``: AQI rounded to
+    integers as floats, NaN where no pollutant was measured, and the index
+    into ``POLLUTANTS`` of the pollutant that set it (-1 when none did).
+    """
+    length = len(next(iter(concentrations.values())))
+    stacked = np.full((len(POLLUTANTS), length), np.nan)
+    for row, pollutant in enumerate(POLLUTANTS):
+        if pollutant in concentrations:
+            stacked[row] = sub_index(pollutant, np.asarray(concentrations[pollutant], dtype=float))
+
+    measured = ~np.isnan(stacked)
+    any_measured = measured.any(axis=0)
+    dominant = np.where(any_measured, np.argmax(np.where(measured, stacked, -np.inf), axis=0), -1)
+    aqi = np.where(any_measured, np.rint(np.fmax.reduce(stacked, axis=0)), np.nan)
+    return aqi, dominant
+
+
+def aqi_for(measurements):
+    """AQI for a single reading given as a dict of pollutant -> µg/m³, or None"""
+    aqi, _ = compute({p: [measurements.get(p)] for p in POLLUTANTS})
+    return None if np.isnan(aqi[0]) else int(aqi[0])
@@ -0,0 +1,180 @@
+"""Pub/sub fan-out of live dashboard events to Server-Sent Events streams.
+
+Every open stream holds a bounded asyncio queue subscribed to its city's
+channel and its user's channel. Publishing pushes one JSON message to each
+subscriber's queue, so a reading reaches every open dashboard without any
+of them querying the database. With ``REDIS_URL`` set, messages go through
+Redis pub/sub and one listener thread per process delivers them locally,
+so events published by ingestion in another process still arrive.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def city_channel(city_id):
+    return f"city:{city_id}"
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def _weather_payload(observation):
+    # Same shape as the weather section of /api/dashboard-data/
+    return {
+        'city': observation.city,
+        'temperature': observation.temperature,
+        'humidity': observation.humidity,
+        'rainfall': observation.rainfall,
+        'description': observation.weather_description,
+        'recorded_at': observation.recorded_at.isoformat(),
+    }
+
+
+def _air_quality_payload(observation):
+    return {
+        'city': observation.city,
+        'aqi': observation.aqi,
+        'category': observation.aqi_category,
+        'color': observation.aqi_color,
+        'pm25': observation.pm25,
+        'recorded_at': observation.recorded_at.isoformat(),
+    }
+
+
+class Broadcaster:
+    PREFIX = 'monsoon:events:'
+    QUEUE_SIZE = 100
+
+    _subscribers = {}  # channel -> {queue: event loop}
+    _lock = threading.Lock()
+    _client = None
+    _listener = None
+
+    @classmethod
+    def publish(cls, channel, event_type, data):
+        """Send ``{"type": event_type, "data": data}`` to everyone subscribed to ``channel``"""
+        cls._send([channel], json.dumps({'type': event_type, 'data': data}, default=str))
+
+    @classmethod
+    def publish_observations(cls, weather=(), air_quality=()):
+        """Push each city's newest reading in a batch to its channel"""
+        for event_type, observations, serialize in (
+            ('weather_update', weather, _weather_payload),
+            ('air_quality_update', air_quality, _air_quality_payload),
+        ):
+            newest = {}
+            for observation in observations:
+                if observation.city_ref_id is not None:
+                    current = newest.get(observation.city_ref_id)
+                    if current is None or observation.recorded_at >= current.recorded_at:
+                        newest[observation.city_ref_id] = observation
+            for city_id, observation in newest.items():
+                cls.publish(city_channel(city_id), event_type, serialize(observation))
+
+    @classmethod
+    def publish_alert(cls, user_ids, alert_type, message, severity):
+        """Push one alert to each of the given users' channels"""
+        payload = json.dumps({
+            'type': 'alert',
+            'data': {'alert_type': alert_type, 'message': message, 'severity': severity},
+        })
+        cls._send([user_channel(user_id) for user_id in user_ids], payload)
+
+    @classmethod
+    def subscribe(cls, channels):
+        """Queue receiving messages for ``channels``; must be called from the consuming event loop"""
+        queue = asyncio.Queue(maxsize=cls.QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+        with cls._lock:
+            for channel in channels:
+                cls._subscribers.setdefault(channel, {})[queue] = loop
+        cls._ensure_listener()
+        return queue
+
+    @classmethod
+    def unsubscribe(cls, channels, queue):
+        with cls._lock:
+            for channel in channels:
+                subscribers = cls._subscribers.get(channel, {})
+                subscribers.pop(queue, None)
+                if not subscribers:
+                    cls._subscribers.pop(channel, None)
+
+    @classmethod
+    def subscriber_count(cls):
+        with cls._lock:
+            return len({queue for subscribers in cls._subscribers.values() for queue in subscribers})
+
+    @classmethod
+    def _send(cls, channels, message):
+        client = cls._redis()
+        if client is not None:
+            try:
+                pipeline = client.pipeline(transaction=False)
+                for channel in channels:
+                    pipeline.publish(cls.PREFIX + channel, message)
+                pipeline.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Error publishing to Redis, delivering locally: {e}")
+        for channel in channels:
+            cls._deliver(channel, message)
+
+    @classmethod
+    def _deliver(cls, channel, message):
+        with cls._lock:
+            targets = list(cls._subscribers.get(channel, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(cls._offer, queue, message)
+            except RuntimeError:
+                # The stream's loop has shut down; it unsubscribes on its way out
+                pass
+
+    @staticmethod
+    def _offer(queue, message):
+        # A client that stops reading loses its oldest messages, not the newest
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    @classmethod
+    def _redis(cls):
+        if not settings.REDIS_URL:
+            return None
+        if cls._client is None:
+            import redis
+            cls._client = redis.Redis.from_url(settings.REDIS_URL)
+        return cls._client
+
+    @classmethod
+    def _ensure_listener(cls):
+        if cls._listener is not None or cls._redis() is None:
+            return
+        with cls._lock:
+            if cls._listener is None:
+                cls._listener = threading.Thread(target=cls._listen, name='broadcast-listener', daemon=True)
+                cls._listener.start()
+
+    @classmethod
+    def _listen(cls):
+        """Relay every Redis event message to this process's subscribers, reconnecting on failure"""
+        while True:
+            try:
+                pubsub = cls._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(cls.PREFIX + '*')
+                for item in pubsub.listen():
+                    if item['type'] == 'pmessage':
+                        channel = item['channel'].decode()[len(cls.PREFIX):]
+                        cls._deliver(channel, item['data'].decode())
+            except Exception as e:
+                logger.warning(f"Event listener lost its Redis connection: {e}")
+                time.sleep(1)
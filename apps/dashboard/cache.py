@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def make_key(*parts):
+    """Build a cache key that is safe for every cache backend"""
+    return ':'.join('_'.join(str(part).split()) for part in parts)
+
+
+def store(key, value, fresh_for, stale_for):
+    """Put a value in the cache in the format ``read_through`` expects"""
+    fresh_seconds = fresh_for() if callable(fresh_for) else fresh_for
+    cache.set(
+        key,
+        {'value': value, 'fresh_until': time.time() + fresh_seconds},
+        timeout=fresh_seconds + stale_for
+    )
+
+
+def peek(key):
+    """Return a value stored by ``read_through``/``store``, fresh or stale, without refreshing it"""
+    entry = cache.get(key)
+    return entry['value'] if entry is not None else None
+
+
+def read_through(key, fetch, fresh_for, stale_for, lock_timeout=30, wait_timeout=5):
+    """Return a cached value, refreshing it through ``fetch`` when it goes stale.
+
+    Entries stay in the cache for ``stale_for`` seconds past their freshness
+    window. Once stale, a single caller (whoever wins ``cache.add`` on the
+    refresh lock) calls ``fetch`` while everyone else keeps getting the old
+    value. Empty results are never cached.
+    """
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and entry['fresh_until'] > now:
+        return entry['value']
+
+    lock_key = f"{key}:refresh"
+    if cache.add(lock_key, True, lock_timeout):
+        try:
+            value = fetch()
+            if value:
+                store(key, value, fresh_for, stale_for)
+                return value
+            if entry is not None:
+                logger.warning(f"Refresh of {key} failed, serving stale value")
+                return entry['value']
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry['value']
+
+    # Cold miss while another worker refreshes: wait for its result
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+
+    logger.warning(f"Timed out waiting for refresh of {key}, fetching directly")
+    return fetch()
+
+
+def single_flight(key, fetch, recheck, lock_timeout=30, wait_timeout=10, poll_interval=0.2):
+    """Run ``fetch`` once per key, however many threads and processes ask for it.
+
+    Threads in this process wait for the leading thread's result. Across
+    processes the leader holds a cache lock; the others poll ``recheck``
+    (normally the database query that missed) until the leader's write shows
+    up or ``wait_timeout`` seconds pass, after which they return whatever
+    ``recheck`` finds, possibly None.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _flights[key] = _Flight()
+
+    if not is_leader:
+        if flight.done.wait(wait_timeout):
+            return flight.result
+        return recheck()
+
+    try:
+        flight.result = _lead_flight(key, fetch, recheck, lock_timeout, wait_timeout, poll_interval)
+        return flight.result
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _lead_flight(key, fetch, recheck, lock_timeout, wait_timeout, poll_interval):
+    """Take the cross-process lock for ``key`` or wait for whoever holds it"""
+    lock_key = f"{key}:flight"
+    deadline = time.monotonic() + wait_timeout
+    while True:
+        if cache.add(lock_key, True, lock_timeout):
+            try:
+                # Another process may have finished between our miss and the lock
+                result = recheck()
+                if result is None:
+                    result = fetch()
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        result = recheck()
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            logger.warning(f"Timed out waiting for {key}")
+            return None
+        time.sleep(poll_interval)
@@ -0,0 +1,284 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import City, CityAlias, ForecastPoint, LatestObservation, MetricBaseline, ObservationRollup
+from .retention import RetentionService
+from .rollups import RollupService
+from .utils import normalize_city
+
+logger = logging.getLogger(__name__)
+
+
+class CityRegistry:
+    """In-process index over the City and CityAlias tables.
+
+    Lookups are a dictionary hit once a name has been seen; misses fall back
+    to the unique indexes on ``City.normalized_name`` and ``CityAlias.alias``.
+    Names the database doesn't know are remembered for ``MISS_TTL`` seconds,
+    and names the provider couldn't resolve for ``RESOLVE_RETRY`` seconds;
+    each of those tables holds at most ``MAX_MISSES`` names.
+
+    When two City rows are merged, a generation number in the shared cache
+    is bumped; every worker checks it at most once per ``GENERATION_CHECK``
+    seconds and drops its index when it has moved.
+    """
+
+    MISS_TTL = 300
+    RESOLVE_RETRY = 3600
+    MAX_MISSES = 10000
+    GENERATION_CHECK = 30
+    GENERATION_KEY = 'cities:generation'
+
+    _index = {}       # normalized name or alias -> City
+    _misses = {}      # normalized name -> monotonic expiry
+    _unresolved = {}  # normalized name -> monotonic time of the next provider attempt
+    _generation = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @classmethod
+    def lookup(cls, name, recheck=False):
+        """Registered city for a free-text name, or None
+
+        ``recheck`` asks the database again even if the name recently missed.
+        """
+        key = normalize_city(name)
+        if not key:
+            return None
+
+        cls._check_generation()
+        city = cls._index.get(key)
+        if city is not None:
+            return city
+        if not recheck and cls._misses.get(key, 0) > time.monotonic():
+            return None
+
+        city = City.objects.filter(normalized_name=key).first()
+        if city is None:
+            alias = CityAlias.objects.select_related('city').filter(alias=key).first()
+            city = alias.city if alias else None
+
+        with cls._lock:
+            if city is not None:
+                cls._index[key] = city
+            else:
+                cls._remember(cls._misses, key, time.monotonic() + cls.MISS_TTL)
+        return city
+
+    @classmethod
+    def _check_generation(cls):
+        """Forget everything this worker has cached if another one has merged cities since"""
+        now = time.monotonic()
+        if now - cls._checked_at < cls.GENERATION_CHECK:
+            return
+        generation = cache.get(cls.GENERATION_KEY, 0)
+        with cls._lock:
+            if cls._generation is not None and generation != cls._generation:
+                cls._index = {}
+                cls._misses = {}
+            cls._generation = generation
+            cls._checked_at = now
+
+    @classmethod
+    def _remember(cls, table, key, expiry):
+        """Record a miss in ``table``, evicting expired and then the oldest entries when full; hold the lock"""
+        table.pop(key, None)
+        if len(table) >= cls.MAX_MISSES:
+            now = time.monotonic()
+            for stale in [name for name, until in table.items() if until <= now]:
+                del table[stale]
+            # Entries share a TTL, so insertion order is expiry order
+            while len(table) >= cls.MAX_MISSES:
+                del table[next(iter(table))]
+        table[key] = expiry
+
+    @classmethod
+    def resolve(cls, name):
+        """Registered city for a name, creating a bare entry (no provider id yet) if needed
+
+        Only call this once a provider has returned data for the name.
+        """
+        city = cls.lookup(name)
+        if city is not None or not normalize_city(name):
+            return city
+
+        key = normalize_city(name)
+        city, _ = City.objects.get_or_create(
+            normalized_name=key,
+            defaults={'name': ' '.join(name.split())}
+        )
+        with cls._lock:
+            cls._index[key] = city
+            cls._misses.pop(key, None)
+        return city
+
+    @classmethod
+    def filter(cls, queryset, name):
+        """Restrict a queryset with a ``city_ref`` foreign key to a city name (indexed equality)"""
+        city = cls.lookup(name)
+        if city is None:
+            return queryset.none()
+        return queryset.filter(city_ref=city)
+
+    @classmethod
+    def load(cls):
+        """Fill the index with every registered city and alias"""
+        index = {city.normalized_name: city for city in City.objects.all()}
+        for alias in CityAlias.objects.select_related('city'):
+            index[alias.alias] = alias.city
+
+        with cls._lock:
+            cls._index = index
+            cls._misses = {}
+            cls._unresolved = {}
+        return len(index)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._index = {}
+            cls._misses = {}
+            cls._unresolved = {}
+            cls._generation = None
+            cls._checked_at = 0.0
+
+    @classmethod
+    def register(cls, name, identity):
+        """Store a provider-resolved city under its own name and the name it was looked up by
+
+        A bare entry created earlier for either name (one with no provider id)
+        is merged into the resolved city, so the place has a single City row.
+        """
+        keys = {normalize_city(name), normalize_city(identity['name'])}
+        merged = []
+        with transaction.atomic():
+            city = None
+            if identity.get('openweather_id'):
+                city = City.objects.filter(openweather_id=identity['openweather_id']).first()
+            if city is None:
+                # Prefer an entry created earlier from the provider's or the user's spelling
+                city = (
+                    City.objects.filter(normalized_name=normalize_city(identity['name'])).first()
+                    or City.objects.filter(normalized_name=normalize_city(name)).first()
+                    or City(normalized_name=normalize_city(identity['name']), name=identity['name'])
+                )
+                city.country = identity.get('country') or ''
+                city.latitude = identity.get('latitude')
+                city.longitude = identity.get('longitude')
+                city.openweather_id = identity.get('openweather_id')
+                city.save()
+
+            mapped = {city.normalized_name}
+            for key in keys - mapped:
+                other = City.objects.filter(normalized_name=key).first()
+                if other is not None:
+                    if other.openweather_id is not None:
+                        # A different resolved city owns this name; leave it be
+                        continue
+                    cls._merge(other, city)
+                    merged.append(other.pk)
+                CityAlias.objects.update_or_create(alias=key, defaults={'city': city})
+                mapped.add(key)
+
+        with cls._lock:
+            if merged:
+                for key, indexed in list(cls._index.items()):
+                    if indexed.pk in merged:
+                        del cls._index[key]
+            for key in mapped:
+                cls._index[key] = city
+                cls._misses.pop(key, None)
+        if merged:
+            cls._bump_generation()
+        return city
+
+    @classmethod
+    def _merge(cls, duplicate, city):
+        """Move everything filed under ``duplicate`` onto ``city``, then delete it; call in a transaction"""
+        # One row per city and key: where both cities have one, ``city`` keeps its own
+        for model, fields in ((ForecastPoint, ('issued_at', 'valid_at')), (MetricBaseline, ('metric',))):
+            taken = set(model.objects.filter(city=city).values_list(*fields))
+            clashing = [
+                pk for pk, *key in model.objects.filter(city=duplicate).values_list('pk', *fields)
+                if tuple(key) in taken
+            ]
+            model.objects.filter(pk__in=clashing).delete()
+
+        RollupService.reassign(duplicate, city)
+
+        latest = LatestObservation.objects.filter(city=duplicate).select_related('weather', 'air_quality').first()
+        if latest is not None:
+            target, _ = LatestObservation.objects.select_related('weather', 'air_quality').get_or_create(city=city)
+            for field in ('weather', 'air_quality'):
+                theirs, ours = getattr(latest, field), getattr(target, field)
+                if theirs is not None and (ours is None or theirs.recorded_at > ours.recorded_at):
+                    setattr(target, field, theirs)
+            target.save()
+            latest.delete()
+
+        # Observations, reports, users, aliases and the rest just change owner
+        for relation in City._meta.related_objects:
+            if relation.related_model in (ObservationRollup, LatestObservation):
+                continue
+            relation.related_model._base_manager.filter(**{relation.field.name: duplicate}).update(
+                **{relation.field.name: city}
+            )
+
+        source_id, target_id = duplicate.pk, city.pk
+        transaction.on_commit(lambda: RetentionService.move_archives(source_id, target_id))
+        logger.info(f"Merged city {duplicate.name!r} (id {duplicate.pk}) into {city.name!r} (id {city.pk})")
+        duplicate.delete()
+
+    @classmethod
+    def _bump_generation(cls):
+        if not cache.add(cls.GENERATION_KEY, 1, None):
+            try:
+                cache.incr(cls.GENERATION_KEY)
+            except ValueError:
+                cache.set(cls.GENERATION_KEY, 1, None)
+        with cls._lock:
+            cls._generation = cache.get(cls.GENERATION_KEY)
+
+    @classmethod
+    def ensure(cls, names, max_workers=None):
+        """Registered cities for ``names``, resolving unknown ones with the provider first.
+
+        Returns a dict of name -> City; names the provider can't resolve are left out.
+        """
+        from .services import WeatherService
+
+        found = {}
+        unknown = []
+        now = time.monotonic()
+        for name in names:
+            city = cls.lookup(name)
+            if city is not None and city.openweather_id:
+                found[name] = city
+            elif cls._unresolved.get(normalize_city(name), 0) > now:
+                if city is not None:
+                    found[name] = city
+            else:
+                unknown.append(name)
+
+        if unknown:
+            workers = max_workers or settings.PROVIDER_CONCURRENCY.get(WeatherService.PROVIDER, 4)
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                identities = list(executor.map(WeatherService.resolve_city, unknown))
+
+            for name, identity in zip(unknown, identities):
+                if identity:
+                    found[name] = cls.register(name, identity)
+                else:
+                    logger.warning(f"Could not resolve city {name!r}")
+                    with cls._lock:
+                        cls._remember(cls._unresolved, normalize_city(name), now + cls.RESOLVE_RETRY)
+                    city = cls.lookup(name)
+                    if city is not None:
+                        found[name] = city
+        return found
@@ -0,0 +1,84 @@
+"""Streams observation history as NDJSON or CSV with constant memory.
+
+Rows are read with chunked ``.iterator()`` querysets and encoded one line
+at a time, so exports of any size can be written to a file or an HTTP
+response without being held in memory.
+"""
+import csv
+import json
+from datetime import datetime, time
+from itertools import chain
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .retention import RetentionService
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def parse_moment(value):
+    """Aware datetime from an ISO date or datetime string; None if blank, ValueError if invalid"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime {value!r}")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def observation_rows(kind, city=None, since=None, until=None, chunk_size=2000):
+    """Yield observations of ``kind`` as dicts, oldest first.
+
+    For a single city, archived months are streamed ahead of live rows.
+    """
+    model, columns = RetentionService.KINDS[kind]
+    queryset = model.objects.all()
+    if city is not None:
+        queryset = queryset.filter(city_ref=city)
+    if since is not None:
+        queryset = queryset.filter(recorded_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(recorded_at__lt=until)
+
+    live = queryset.order_by('recorded_at', 'pk').values(*columns).iterator(chunk_size=chunk_size)
+    if city is not None:
+        return chain(RetentionService.archived(kind, city, since, until), live)
+    return live
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def encode(rows, fmt, columns):
+    """Yield ``rows`` encoded as NDJSON or CSV lines"""
+    if fmt == 'ndjson':
+        for row in rows:
+            yield json.dumps(row, default=_json_default) + '\n'
+    elif fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(
+                [row[column].isoformat() if isinstance(row[column], datetime) else row[column] for column in columns]
+            )
+    else:
+        raise ValueError(f"Unknown export format {fmt!r}")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
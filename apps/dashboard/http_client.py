@@ -0,0 +1,133 @@
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+
+class JitteredRetry(Retry):
+    """Retry policy that spreads exponential backoff over [0, backoff] ("full jitter")
+
+    A provider's Retry-After is honoured up to ``max_retry_after`` seconds,
+    so a throttled provider can't hold a request thread for minutes.
+    """
+
+    def __init__(self, *args, max_retry_after=None, **kwargs):
+        self.max_retry_after = max_retry_after
+        super().__init__(*args, **kwargs)
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None and self.max_retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return retry_after
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that applies a default (connect, read) timeout to every request"""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class ProviderClient:
+    """Shared keep-alive sessions, one per external data provider"""
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    _sessions = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, provider, url, **kwargs):
+        """Send a GET through the provider's pooled session"""
+        return cls.session(provider).get(url, **kwargs)
+
+    @classmethod
+    def session(cls, provider):
+        """Return the provider's session, creating it on first use"""
+        session = cls._sessions.get(provider)
+        if session is None:
+            with cls._lock:
+                session = cls._sessions.get(provider)
+                if session is None:
+                    session = cls._build_session(provider)
+                    cls._sessions[provider] = session
+        return session
+
+    @classmethod
+    def close_all(cls):
+        """Close every pooled connection, e.g. after settings change in tests"""
+        with cls._lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+
+    @classmethod
+    def get_options(cls, provider):
+        """Merge the provider's HTTP options over the defaults"""
+        options = dict(settings.PROVIDER_HTTP.get('default', {}))
+        options.update(settings.PROVIDER_HTTP.get(provider, {}))
+        options.setdefault('pool_maxsize', settings.PROVIDER_CONCURRENCY.get(provider, 10))
+        return options
+
+    @classmethod
+    def _build_session(cls, provider):
+        options = cls.get_options(provider)
+
+        retry = JitteredRetry(
+            total=options['retries'],
+            backoff_factor=options['backoff_factor'],
+            status_forcelist=cls.RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            max_retry_after=options['max_retry_after'],
+            raise_on_status=False,
+        )
+        adapter_kwargs = {
+            'timeout': (options['connect_timeout'], options['read_timeout']),
+            'max_retries': retry,
+            'pool_connections': options['pool_connections'],
+            'pool_maxsize': options['pool_maxsize'],
+        }
+
+        mode = settings.PROVIDER_HTTP_MODE
+        if mode == 'live':
+            adapter = TimeoutHTTPAdapter(**adapter_kwargs)
+        else:
+            from .replay import Cassette, RecordingAdapter, ReplayAdapter
+
+            cassette = Cassette(settings.PROVIDER_CASSETTE_DIR)
+            if mode == 'record':
+                adapter = RecordingAdapter(cassette=cassette, **adapter_kwargs)
+            elif mode == 'replay':
+                adapter = ReplayAdapter(cassette=cassette, **settings.PROVIDER_REPLAY)
+            else:
+                raise ValueError(f"Unknown PROVIDER_HTTP_MODE {mode!r}")
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+            'User-Agent': 'monsoon-tracker/1.0',
+        })
+        return session
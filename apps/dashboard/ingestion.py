@@ -0,0 +1,173 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .cities import CityRegistry
+from .rainfall import RainfallService
+from .services import WeatherService, AirQualityService, DataService
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionService:
+    # data kind -> provider whose concurrency limit applies
+    KINDS = {
+        'weather': WeatherService.PROVIDER,
+        'air_quality': AirQualityService.PROVIDER,
+        'forecast': WeatherService.PROVIDER,
+    }
+
+    @classmethod
+    def ingest(cls, cities, kinds=None, max_workers=None):
+        """Fetch data for many cities concurrently and store it in one transaction
+
+        Cities are submitted in the order given, so callers can put the
+        busiest cities first. Forecasts are upserted as forecast points and
+        warm the forecast cache.
+        """
+        cities = cls._clean_cities(cities)
+        kinds = list(kinds or cls.KINDS.keys())
+        max_workers = max_workers or settings.INGESTION_MAX_WORKERS
+        started = time.monotonic()
+
+        # Resolve provider ids up front so weather can use grouped fetches
+        # and worker threads never need the database
+        if 'weather' in kinds or 'forecast' in kinds:
+            registered = CityRegistry.ensure(cities)
+        else:
+            registered = {}
+
+        # One bounded pool per provider, so a slow provider cannot starve the others
+        executors = {}
+        futures = []
+        try:
+            for kind in kinds:
+                provider = cls.KINDS[kind]
+                if provider not in executors:
+                    workers = min(max_workers, settings.PROVIDER_CONCURRENCY.get(provider, 4))
+                    executors[provider] = ThreadPoolExecutor(
+                        max_workers=max(1, workers),
+                        thread_name_prefix=f"ingest-{provider}"
+                    )
+                for job_cities, fetch in cls._plan(kind, cities, registered):
+                    futures.append(
+                        executors[provider].submit(cls._run_job, kind, provider, job_cities, fetch)
+                    )
+            results = [result for future in futures for result in future.result()]
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+
+        weather_records = []
+        air_quality_records = []
+        forecasts = {}
+        for result in results:
+            data = result.pop('data')
+            if result['success'] and result['kind'] == 'forecast':
+                forecasts[result['city']] = data
+            elif result['success']:
+                # File readings under the city that was asked for, not the provider's spelling
+                data['city_ref'] = registered.get(result['city']) or CityRegistry.resolve(result['city'])
+                if result['kind'] == 'weather':
+                    weather_records.append(data)
+                else:
+                    air_quality_records.append(data)
+
+        weather_objs, _ = DataService.save_observations(
+            weather_records=weather_records,
+            air_quality_records=air_quality_records
+        )
+        # Threshold alerts go out from ingestion, never from a page view's fetch
+        RainfallService.alert(weather_objs)
+        if forecasts:
+            WeatherService.save_forecasts(forecasts)
+
+        succeeded = sum(1 for r in results if r['success'])
+        report = {
+            'results': results,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'requests': len(futures),
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+        }
+        logger.info(
+            f"Ingested {succeeded}/{len(results)} fetches for {len(cities)} cities "
+            f"with {len(futures)} provider calls in {report['elapsed_ms']}ms"
+        )
+        return report
+
+    @classmethod
+    def _plan(cls, kind, cities, registered):
+        """Split cities into provider calls as (cities, fetch) pairs.
+
+        Each ``fetch`` returns a dict of city -> data for the cities in its call.
+        """
+        if kind == 'weather':
+            grouped = [city for city in cities if city in registered and registered[city].openweather_id]
+            size = settings.OPENWEATHER_GROUP_MAX
+            for start in range(0, len(grouped), size):
+                chunk = grouped[start:start + size]
+                yield chunk, lambda chunk=chunk: cls._fetch_weather_group(chunk, registered)
+            grouped_set = set(grouped)
+            for city in cities:
+                if city not in grouped_set:
+                    yield [city], lambda city=city: {city: WeatherService.get_current_weather(city)}
+
+        elif kind == 'air_quality':
+            size = settings.OPENAQ_GROUP_MAX
+            for start in range(0, len(cities), size):
+                chunk = cities[start:start + size]
+                yield chunk, lambda chunk=chunk: AirQualityService.get_air_quality_group(chunk)
+
+        elif kind == 'forecast':
+            # The forecast endpoint has no grouped variant
+            days = max(settings.FORECAST_HORIZONS)
+            for city in cities:
+                yield [city], lambda city=city: {city: WeatherService.fetch_forecast(city, days) or None}
+
+    @classmethod
+    def _fetch_weather_group(cls, cities, registered):
+        provider_ids = dict.fromkeys(registered[city].openweather_id for city in cities)
+        weather_by_id = WeatherService.get_current_weather_group(list(provider_ids))
+        return {city: weather_by_id.get(registered[city].openweather_id) for city in cities}
+
+    @classmethod
+    def _run_job(cls, kind, provider, cities, fetch):
+        """Run one provider call and report it for each city it covered"""
+        started = time.monotonic()
+        error = None
+        try:
+            data_by_city = fetch()
+        except Exception as e:
+            logger.error(f"Ingestion error for {kind} in {', '.join(cities)}: {str(e)}")
+            data_by_city = {}
+            error = str(e)
+        latency_ms = round((time.monotonic() - started) * 1000, 1)
+
+        results = []
+        for city in cities:
+            data = data_by_city.get(city)
+            results.append({
+                'city': city,
+                'kind': kind,
+                'provider': provider,
+                'success': data is not None,
+                'latency_ms': latency_ms,
+                'error': None if data is not None else (error or 'No data returned'),
+                'data': data,
+            })
+        return results
+
+    @classmethod
+    def _clean_cities(cls, cities):
+        """Strip blanks and duplicates while keeping the given order"""
+        seen = set()
+        cleaned = []
+        for city in cities:
+            city = (city or '').strip()
+            if city and city.lower() not in seen:
+                seen.add(city.lower())
+                cleaned.append(city)
+        return cleaned
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard.cities import CityRegistry
+from apps.dashboard.retention import RetentionService
+
+
+class Command(BaseCommand):
+    help = "Archive weather and air quality readings past the retention horizon and delete them from the live tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Keep this many days live (default OBSERVATION_RETENTION_DAYS)")
+        parser.add_argument('--city', help="Only archive this city")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Count rows without archiving them")
+
+    def handle(self, *args, **options):
+        city = None
+        if options['city']:
+            city = CityRegistry.lookup(options['city'])
+            if city is None:
+                raise CommandError(f"Unknown city {options['city']!r}")
+
+        cutoff = RetentionService.cutoff(options['days'])
+        counts = RetentionService.archive(
+            older_than=cutoff,
+            city=city,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+
+        action = "would archive" if options['dry_run'] else "archived"
+        summary = ', '.join(f"{count} {kind}" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Readings before {cutoff:%Y-%m-%d}: {action} {summary}"))
@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from apps.dashboard.http_client import ProviderClient
+from apps.dashboard.ingestion import IngestionService
+
+
+class Command(BaseCommand):
+    help = "Benchmark batch ingestion, normally against recorded provider responses (PROVIDER_HTTP_MODE=replay)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('cities', nargs='+', help="Cities to ingest in every round")
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--kind', action='append', choices=list(IngestionService.KINDS.keys()))
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--latency-ms', type=float, default=None, help="Override simulated provider latency")
+        parser.add_argument('--jitter-ms', type=float, default=None, help="Override simulated latency jitter")
+        parser.add_argument('--error-rate', type=float, default=None, help="Override simulated error rate (0-1)")
+        parser.add_argument('--max-rps', type=float, default=None, help="Override simulated provider throughput")
+        parser.add_argument('--allow-live', action='store_true', help="Run even when not replaying recordings")
+
+    def handle(self, *args, **options):
+        if settings.PROVIDER_HTTP_MODE != 'replay' and not options['allow_live']:
+            raise CommandError(
+                "Benchmarks spend real API quota unless PROVIDER_HTTP_MODE=replay; "
+                "pass --allow-live to run anyway"
+            )
+
+        replay = dict(settings.PROVIDER_REPLAY)
+        for name in ('latency_ms', 'jitter_ms', 'error_rate', 'max_rps'):
+            if options[name] is not None:
+                replay[name] = options[name]
+
+        with override_settings(PROVIDER_REPLAY=replay):
+            ProviderClient.close_all()
+            try:
+                self._run(options)
+            finally:
+                ProviderClient.close_all()
+
+    def _run(self, options):
+        round_times = []
+        latencies = []
+        fetches = failures = requests = 0
+
+        for round_number in range(1, options['rounds'] + 1):
+            started = time.monotonic()
+            report = IngestionService.ingest(
+                options['cities'],
+                kinds=options['kind'],
+                max_workers=options['workers']
+            )
+            round_times.append(time.monotonic() - started)
+            latencies.extend(result['latency_ms'] for result in report['results'])
+            fetches += len(report['results'])
+            failures += report['failed']
+            requests += report['requests']
+            self.stdout.write(
+                f"round {round_number}: {report['succeeded']} ok, {report['failed']} failed, "
+                f"{report['requests']} provider calls in {round_times[-1] * 1000:.1f}ms"
+            )
+
+        total = sum(round_times)
+        latencies.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f"{fetches} city fetches in {total:.2f}s ({fetches / total:.1f}/s, "
+            f"{requests / total:.1f} provider calls/s), {failures} failed"
+        ))
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f"call latency ms: median {statistics.median(latencies):.1f}, "
+                f"p95 {p95:.1f}, max {latencies[-1]:.1f}"
+            )
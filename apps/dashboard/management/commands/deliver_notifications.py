@@ -0,0 +1,29 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.notifications import NotificationDispatcher
+
+
+class Command(BaseCommand):
+    help = "Coalesce pending alerts into digests and send them by email/SMS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run a single collect-and-send pass and exit")
+        parser.add_argument('--tick', type=int, default=None, help="Seconds between passes")
+
+    def handle(self, *args, **options):
+        dispatcher = NotificationDispatcher(tick=options['tick'])
+
+        if options['once']:
+            report = dispatcher.run_once()
+            self.stdout.write(
+                f"Queued {report['queued']} digests; sent {report['sent']}, "
+                f"{report['retrying']} to retry, {report['failed']} failed"
+            )
+            return
+
+        signal.signal(signal.SIGTERM, dispatcher.stop)
+        signal.signal(signal.SIGINT, dispatcher.stop)
+        self.stdout.write(self.style.SUCCESS("Notification dispatcher running, press Ctrl+C to stop"))
+        dispatcher.run_forever()
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard import export
+from apps.dashboard.cities import CityRegistry
+from apps.dashboard.retention import RetentionService
+
+
+class Command(BaseCommand):
+    help = "Stream weather or air quality history to a file or stdout as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(RetentionService.KINDS.keys()))
+        parser.add_argument('--city', help="Only export this city (includes archived months)")
+        parser.add_argument('--from', dest='since', help="Start date or datetime (ISO 8601, inclusive)")
+        parser.add_argument('--to', dest='until', help="End date or datetime (ISO 8601, exclusive)")
+        parser.add_argument('--format', choices=list(export.FORMATS.keys()), default='ndjson')
+        parser.add_argument('--output', '-o', help="File to write (default stdout)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched from the database at a time")
+
+    def handle(self, *args, **options):
+        try:
+            since = export.parse_moment(options['since'])
+            until = export.parse_moment(options['until'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        city = None
+        if options['city']:
+            city = CityRegistry.lookup(options['city'])
+            if city is None:
+                raise CommandError(f"Unknown city {options['city']!r}")
+
+        columns = list(RetentionService.KINDS[options['kind']][1])
+        rows = export.observation_rows(
+            options['kind'], city=city, since=since, until=until, chunk_size=options['chunk_size']
+        )
+
+        written = 0
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for line in export.encode(rows, options['format'], columns):
+                output.write(line)
+                written += 1
+        finally:
+            if options['output']:
+                output.close()
+
+        if options['output']:
+            rows_written = written - 1 if options['format'] == 'csv' else written
+            self.stderr.write(f"Wrote {rows_written} rows to {options['output']}")
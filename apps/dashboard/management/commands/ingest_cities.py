@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+
+from apps.dashboard.ingestion import IngestionService
+
+
+class Command(BaseCommand):
+    help = "Fetch weather and air quality data for many cities concurrently"
+
+    def add_arguments(self, parser):
+        parser.add_argument('cities', nargs='*', help="Cities to refresh (defaults to every city users live in)")
+        parser.add_argument(
+            '--kind',
+            action='append',
+            choices=list(IngestionService.KINDS.keys()),
+            help="Data kind to fetch; repeat for several (default: all)"
+        )
+        parser.add_argument('--workers', type=int, default=None, help="Upper bound on threads per provider")
+
+    def handle(self, *args, **options):
+        cities = options['cities']
+        if not cities:
+            User = get_user_model()
+            cities = (
+                User.objects.exclude(city__isnull=True)
+                .exclude(city='')
+                .values_list('city', flat=True)
+                .distinct()
+            )
+
+        report = IngestionService.ingest(
+            cities,
+            kinds=options['kind'],
+            max_workers=options['workers']
+        )
+
+        for result in report['results']:
+            line = f"{result['kind']:<12} {result['city']:<25} {result['latency_ms']:>8.1f}ms"
+            if result['success']:
+                self.stdout.write(self.style.SUCCESS(f"OK    {line}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"FAIL  {line}  {result['error']}"))
+
+        self.stdout.write(
+            f"{report['succeeded']} succeeded, {report['failed']} failed in {report['elapsed_ms']}ms"
+        )
@@ -0,0 +1,51 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard.services import WaterLevelService
+
+FLOAT_FIELDS = ('current_level', 'normal_level', 'warning_level', 'danger_level', 'latitude', 'longitude')
+TEXT_FIELDS = ('location_name', 'city', 'water_body_type')
+
+
+class Command(BaseCommand):
+    help = "Load gauge readings from a CSV or JSON file and alert cities whose gauges have gone critical"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV with a header row, or a JSON list of objects; '-' reads stdin")
+        parser.add_argument('--format', choices=['csv', 'json'], default=None, help="Defaults to the file extension")
+        parser.add_argument('--no-alerts', action='store_true', help="Update gauges without alerting residents")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.endswith('.json') else 'csv')
+        try:
+            if path == '-':
+                records = self._parse(sys.stdin, fmt)
+            else:
+                with open(path, newline='', encoding='utf-8') as source:
+                    records = self._parse(source, fmt)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {path}: {str(e)}")
+
+        levels = []
+        for number, record in enumerate(records, start=1):
+            try:
+                level = {field: str(record[field]).strip() for field in TEXT_FIELDS}
+                level.update({field: float(record[field]) for field in FLOAT_FIELDS})
+            except (KeyError, TypeError, ValueError) as e:
+                raise CommandError(f"Reading {number} is missing a field or has a bad value: {str(e)}")
+            levels.append(level)
+
+        written = WaterLevelService.upsert(levels, alert=not options['no_alerts'])
+        self.stdout.write(self.style.SUCCESS(f"Updated {written} gauges"))
+
+    def _parse(self, source, fmt):
+        if fmt == 'json':
+            records = json.load(source)
+            if not isinstance(records, list):
+                raise ValueError("expected a JSON list of gauge readings")
+            return records
+        return list(csv.DictReader(source))
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.dashboard.cities import CityRegistry
+from apps.dashboard.rollups import RollupService
+
+
+class Command(BaseCommand):
+    help = "Recompute hourly and daily observation rollups from the raw weather and air quality tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', help="Only rebuild this city")
+        parser.add_argument('--days', type=int, default=None, help="Only rebuild the last N days")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Raw rows read per chunk")
+
+    def handle(self, *args, **options):
+        city = None
+        if options['city']:
+            city = CityRegistry.lookup(options['city'])
+            if city is None:
+                raise CommandError(f"Unknown city {options['city']!r}")
+
+        since = None
+        if options['days'] is not None:
+            since = timezone.now() - timedelta(days=options['days'])
+
+        folded = RollupService.rebuild(city=city, since=since, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups from {folded} observations"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.alerts import AlertInbox
+
+
+class Command(BaseCommand):
+    help = "Recount every user's unread alerts and repair counters that have drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many counters are wrong")
+
+    def handle(self, *args, **options):
+        fixed = AlertInbox.reconcile(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{fixed} users have a drifted unread alert count")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired unread alert counts for {fixed} users"))
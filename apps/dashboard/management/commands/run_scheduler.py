@@ -0,0 +1,30 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.dashboard.scheduler import RefreshScheduler
+
+
+class Command(BaseCommand):
+    help = "Run the background refresh scheduler that keeps city data warm"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run a single refresh pass and exit")
+        parser.add_argument('--tick', type=int, default=None, help="Seconds between refresh passes")
+
+    def handle(self, *args, **options):
+        scheduler = RefreshScheduler(tick=options['tick'])
+
+        if options['once']:
+            reports = scheduler.run_once()
+            for kind, report in reports.items():
+                self.stdout.write(
+                    f"{kind}: {report['succeeded']} succeeded, {report['failed']} failed "
+                    f"in {report['elapsed_ms']}ms"
+                )
+            return
+
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+        self.stdout.write(self.style.SUCCESS("Refresh scheduler running, press Ctrl+C to stop"))
+        scheduler.run_forever()
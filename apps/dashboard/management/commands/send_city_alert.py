@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard.alerts import AlertFanout
+from apps.dashboard.cities import CityRegistry
+
+
+class Command(BaseCommand):
+    help = "Send an alert to every resident of a city who has notifications enabled"
+
+    def add_arguments(self, parser):
+        parser.add_argument('city')
+        parser.add_argument('message')
+        parser.add_argument('--type', dest='alert_type', default='weather',
+                            choices=['weather', 'air_quality', 'water_level'])
+        parser.add_argument('--severity', default='warning', choices=['info', 'warning', 'danger'])
+        parser.add_argument('--dedupe-key', default='', help="Skip residents alerted with this key recently")
+        parser.add_argument('--cooldown', type=int, default=None, help="Dedupe window in seconds")
+
+    def handle(self, *args, **options):
+        city = CityRegistry.lookup(options['city'])
+        if city is None:
+            raise CommandError(f"Unknown city {options['city']!r}")
+
+        report = AlertFanout.send(
+            city.pk,
+            options['alert_type'],
+            options['message'],
+            severity=options['severity'],
+            dedupe_key=options['dedupe_key'],
+            cooldown=options['cooldown']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {report['created']} alerts to {city} in {report['elapsed_ms'] / 1000:.2f}s"
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+
+from apps.dashboard.cities import CityRegistry
+
+
+class Command(BaseCommand):
+    help = "Resolve city names to provider ids and coordinates and store them in the city registry"
+
+    def add_arguments(self, parser):
+        parser.add_argument('cities', nargs='*', help="Cities to register (defaults to every city users live in)")
+
+    def handle(self, *args, **options):
+        cities = options['cities']
+        if not cities:
+            User = get_user_model()
+            cities = list(
+                User.objects.exclude(city__isnull=True)
+                .exclude(city='')
+                .values_list('city', flat=True)
+                .distinct()
+            )
+
+        registered = CityRegistry.ensure(cities)
+        for name in cities:
+            city = registered.get(name)
+            if city is not None:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{name:<25} -> {city} (id {city.openweather_id}, {city.latitude}, {city.longitude})"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"{name:<25} -> not found"))
+
+        self.stdout.write(f"{len(registered)}/{len(cities)} cities registered")
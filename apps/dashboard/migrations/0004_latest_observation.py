@@ -0,0 +1,96 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_latest(apps, schema_editor):
+    City = apps.get_model("dashboard", "City")
+    LatestObservation = apps.get_model("dashboard", "LatestObservation")
+    WeatherData = apps.get_model("dashboard", "WeatherData")
+    AirQualityData = apps.get_model("dashboard", "AirQualityData")
+    rows = []
+    for city_id in City.objects.values_list("pk", flat=True):
+        # Each lookup is a single seek on the (city_ref, -recorded_at) index
+        weather_id = (
+            WeatherData.objects.filter(city_ref_id=city_id)
+            .order_by("-recorded_at")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        air_quality_id = (
+            AirQualityData.objects.filter(city_ref_id=city_id)
+            .order_by("-recorded_at")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if weather_id or air_quality_id:
+            rows.append(
+                LatestObservation(
+                    city_id=city_id,
+                    weather_id=weather_id,
+                    air_quality_id=air_quality_id,
+                )
+            )
+    LatestObservation.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0003_city_foreign_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LatestObservation",
+            fields=[
+                (
+                    "city",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="latest",
+                        serialize=False,
+                        to="dashboard.city",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="airqualitydata",
+            index=models.Index(
+                fields=["city_ref", "-recorded_at"], name="aq_city_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="weatherdata",
+            index=models.Index(
+                fields=["city_ref", "-recorded_at"], name="weather_city_recent_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="latestobservation",
+            name="air_quality",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="dashboard.airqualitydata",
+            ),
+        ),
+        migrations.AddField(
+            model_name="latestobservation",
+            name="weather",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="dashboard.weatherdata",
+            ),
+        ),
+        migrations.RunPython(backfill_latest, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0004_latest_observation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ObservationRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("metric", models.CharField(max_length=20)),
+                (
+                    "resolution",
+                    models.CharField(
+                        choices=[("hour", "Hourly"), ("day", "Daily")], max_length=4
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("minimum", models.FloatField(blank=True, null=True)),
+                ("maximum", models.FloatField(blank=True, null=True)),
+                ("total", models.FloatField(default=0.0)),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="dashboard.city",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["bucket_start"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="observationrollup",
+            constraint=models.UniqueConstraint(
+                fields=("city", "resolution", "metric", "bucket_start"),
+                name="unique_rollup_bucket",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0005_observation_rollups"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="airqualitydata",
+            name="aq_city_recent_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="weatherdata",
+            name="weather_city_recent_idx",
+        ),
+        migrations.AddIndex(
+            model_name="airqualitydata",
+            index=models.Index(
+                fields=["city_ref", "-recorded_at", "-id"], name="aq_city_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="weatherdata",
+            index=models.Index(
+                fields=["city_ref", "-recorded_at", "-id"],
+                name="weather_city_recent_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0006_history_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ForecastPoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("issued_at", models.DateTimeField()),
+                ("valid_at", models.DateTimeField()),
+                ("temperature", models.FloatField()),
+                ("humidity", models.FloatField()),
+                ("rainfall", models.FloatField(default=0.0)),
+                ("wind_speed", models.FloatField()),
+                ("description", models.CharField(max_length=200)),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="forecast_points",
+                        to="dashboard.city",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["valid_at"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="forecastpoint",
+            constraint=models.UniqueConstraint(
+                fields=("city", "issued_at", "valid_at"), name="unique_forecast_point"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0007_forecast_points"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="weatherdata",
+            name="rainfall_window",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0008_weatherdata_rainfall_window"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetricBaseline",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("metric", models.CharField(max_length=20)),
+                ("mean", models.FloatField(default=0.0)),
+                ("variance", models.FloatField(default=0.0)),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("last_value", models.FloatField(blank=True, null=True)),
+                ("last_alert_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="baselines",
+                        to="dashboard.city",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="metricbaseline",
+            constraint=models.UniqueConstraint(
+                fields=("city", "metric"), name="unique_metric_baseline"
+            ),
+        ),
+    ]
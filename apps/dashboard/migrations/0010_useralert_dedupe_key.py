@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0009_metric_baselines"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="useralert",
+            name="dedupe_key",
+            field=models.CharField(blank=True, default="", max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name="useralert",
+            index=models.Index(
+                fields=["dedupe_key", "created_at"], name="alert_dedupe_idx"
+            ),
+        ),
+    ]
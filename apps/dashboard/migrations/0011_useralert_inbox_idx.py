@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0010_useralert_dedupe_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="useralert",
+            index=models.Index(
+                fields=["user", "is_read", "-created_at"], name="alert_inbox_idx"
+            ),
+        ),
+    ]
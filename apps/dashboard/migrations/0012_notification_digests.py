@@ -0,0 +1,94 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def mark_existing_alerts_notified(apps, schema_editor):
+    # Alerts raised before digests existed shouldn't all be emailed at once
+    UserAlert = apps.get_model("dashboard", "UserAlert")
+    UserAlert.objects.filter(notified_at__isnull=True).update(
+        notified_at=models.F("created_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("dashboard", "0011_useralert_inbox_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationDigest",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("transport", models.CharField(max_length=20)),
+                ("recipient", models.CharField(max_length=254)),
+                ("subject", models.CharField(max_length=200)),
+                ("body", models.TextField()),
+                ("alert_count", models.PositiveIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("sent", "Sent"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="useralert",
+            name="notified_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_alerts_notified, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="useralert",
+            index=models.Index(
+                condition=models.Q(("notified_at__isnull", True)),
+                fields=["user", "created_at"],
+                name="alert_pending_digest_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationdigest",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="notification_digests",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificationdigest",
+            index=models.Index(
+                fields=["status", "transport", "next_attempt_at"],
+                name="digest_queue_idx",
+            ),
+        ),
+    ]
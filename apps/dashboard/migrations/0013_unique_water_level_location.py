@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:53
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicate_gauges(apps, schema_editor):
+    # get_or_create by location_name could race into duplicates; keep the newest row
+    WaterLevel = apps.get_model("dashboard", "WaterLevel")
+    newest = (
+        WaterLevel.objects.values("location_name")
+        .annotate(keep=Max("pk"))
+        .values_list("keep", flat=True)
+    )
+    WaterLevel.objects.exclude(pk__in=list(newest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0012_notification_digests"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_gauges, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="waterlevel",
+            name="location_name",
+            field=models.CharField(max_length=200, unique=True),
+        ),
+    ]
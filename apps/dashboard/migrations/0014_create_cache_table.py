@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:30
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The default DatabaseCache needs its table before the first request;
+    # this is a no-op when the table exists or the cache isn't database-backed
+    call_command(
+        "createcachetable", database=schema_editor.connection.alias, verbosity=0
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0013_unique_water_level_location"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -1,29 +1,81 @@
+import numpy as np
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
+def resolve_city(name):
+    """City entry for a free-text name, or None for a blank name"""
+    from .cities import CityRegistry
+    return CityRegistry.resolve(name)
+
+class City(models.Model):
+    name = models.CharField(max_length=100)
+    normalized_name = models.CharField(max_length=100, unique=True)
+    country = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    openweather_id = models.BigIntegerField(null=True, blank=True, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'cities'
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name}, {self.country}" if self.country else self.name
+
+class CityAlias(models.Model):
+    # Normalized spellings that resolve to a city, e.g. "bombay" -> Mumbai
+    alias = models.CharField(max_length=100, unique=True)
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='aliases')
+    
+    class Meta:
+        verbose_name_plural = 'city aliases'
+    
+    def __str__(self):
+        return f"{self.alias} -> {self.city.name}"
+
 class WeatherData(models.Model):
     city = models.CharField(max_length=100)
+    city_ref = models.ForeignKey(
+        City, on_delete=models.SET_NULL, null=True, blank=True, related_name='weather_observations'
+    )
     country = models.CharField(max_length=100)
     temperature = models.FloatField()
     humidity = models.FloatField()
     pressure = models.FloatField()
     rainfall = models.FloatField(default=0.0)  # in mm
+    rainfall_window = models.PositiveSmallIntegerField(default=1)  # hours the rainfall amount covers (1 or 3)
     wind_speed = models.FloatField()
     weather_description = models.CharField(max_length=200)
     recorded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['city_ref', '-recorded_at', '-id'], name='weather_city_recent_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if self.city_ref_id is None:
+            self.city_ref = resolve_city(self.city)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.city} - {self.recorded_at.strftime('%Y-%m-%d %H:%M')}"
 
 class AirQualityData(models.Model):
     city = models.CharField(max_length=100)
+    city_ref = models.ForeignKey(
+        City, on_delete=models.SET_NULL, null=True, blank=True, related_name='air_quality_observations'
+    )
     country = models.CharField(max_length=100)
     aqi = models.IntegerField()  # Air Quality Index
+    # Pollutant concentrations, all in µg/m³
     pm25 = models.FloatField(null=True, blank=True)  # PM2.5
     pm10 = models.FloatField(null=True, blank=True)  # PM10
     o3 = models.FloatField(null=True, blank=True)    # Ozone
@@ -61,10 +113,107 @@ class AirQualityData(models.Model):
     
     class Meta:
         ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['city_ref', '-recorded_at', '-id'], name='aq_city_recent_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if self.city_ref_id is None:
+            self.city_ref = resolve_city(self.city)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.city} AQI: {self.aqi} - {self.recorded_at.strftime('%Y-%m-%d %H:%M')}"
 
+class LatestObservation(models.Model):
+    # Newest reading of each kind per city, upserted on ingestion so the
+    # dashboard reads one row by primary key instead of scanning history
+    city = models.OneToOneField(City, on_delete=models.CASCADE, primary_key=True, related_name='latest')
+    weather = models.ForeignKey(
+        WeatherData, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    air_quality = models.ForeignKey(
+        AirQualityData, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Latest for {self.city.name}"
+
+class ForecastPoint(models.Model):
+    # One forecast step: what the provider's run issued at ``issued_at``
+    # predicted for ``valid_at``. Earlier runs are kept so forecasts can be
+    # compared with what was later observed.
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='forecast_points')
+    issued_at = models.DateTimeField()
+    valid_at = models.DateTimeField()
+    temperature = models.FloatField()
+    humidity = models.FloatField()
+    rainfall = models.FloatField(default=0.0)  # in mm
+    wind_speed = models.FloatField()
+    description = models.CharField(max_length=200)
+    
+    class Meta:
+        ordering = ['valid_at']
+        constraints = [
+            models.UniqueConstraint(fields=['city', 'issued_at', 'valid_at'], name='unique_forecast_point'),
+        ]
+    
+    def __str__(self):
+        return f"{self.city.name} {self.valid_at:%Y-%m-%d %H:%M} (issued {self.issued_at:%Y-%m-%d %H:%M})"
+
+class ObservationRollup(models.Model):
+    RESOLUTIONS = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    # Running aggregate of one metric (e.g. "temperature", "pm25") over one
+    # hour or day, kept up to date as observations are ingested
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='rollups')
+    metric = models.CharField(max_length=20)
+    resolution = models.CharField(max_length=4, choices=RESOLUTIONS)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    minimum = models.FloatField(null=True, blank=True)
+    maximum = models.FloatField(null=True, blank=True)
+    total = models.FloatField(default=0.0)
+    
+    class Meta:
+        ordering = ['bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['city', 'resolution', 'metric', 'bucket_start'], name='unique_rollup_bucket'
+            ),
+        ]
+    
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+    
+    def __str__(self):
+        return f"{self.city.name} {self.metric} {self.resolution} {self.bucket_start:%Y-%m-%d %H:%M}"
+
+class MetricBaseline(models.Model):
+    # Exponentially weighted mean and variance of one metric in one city,
+    # updated with every reading so spikes can be spotted without scanning history
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='baselines')
+    metric = models.CharField(max_length=20)
+    mean = models.FloatField(default=0.0)
+    variance = models.FloatField(default=0.0)
+    count = models.PositiveIntegerField(default=0)
+    last_value = models.FloatField(null=True, blank=True)  # previous raw reading, for change-based metrics
+    last_alert_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['city', 'metric'], name='unique_metric_baseline'),
+        ]
+    
+    def __str__(self):
+        return f"{self.city.name} {self.metric}: {self.mean:.2f} ± {self.variance ** 0.5:.2f}"
+
 class WaterLevel(models.Model):
     ALERT_LEVELS = [
         ('normal', 'Normal'),
@@ -73,7 +222,7 @@ class WaterLevel(models.Model):
         ('critical', 'Critical'),
     ]
     
-    location_name = models.CharField(max_length=200)
+    location_name = models.CharField(max_length=200, unique=True)
     city = models.CharField(max_length=100)
     water_body_type = models.CharField(
         max_length=50, 
@@ -92,15 +241,22 @@ class WaterLevel(models.Model):
     def level_percentage(self):
         return min(100, (self.current_level / self.danger_level) * 100)
     
+    @staticmethod
+    def alert_statuses(current, normal, warning, danger):
+        """Alert status for each gauge, given equal-length sequences of its levels"""
+        current, normal, warning, danger = (
+            np.asarray(levels, dtype=float) for levels in (current, normal, warning, danger)
+        )
+        return np.select(
+            [current >= danger, current >= warning, current >= normal * 1.2],
+            ['critical', 'danger', 'warning'],
+            default='normal'
+        ).tolist()
+    
     def update_alert_status(self):
-        if self.current_level >= self.danger_level:
-            self.alert_status = 'critical'
-        elif self.current_level >= self.warning_level:
-            self.alert_status = 'danger'
-        elif self.current_level >= self.normal_level * 1.2:
-            self.alert_status = 'warning'
-        else:
-            self.alert_status = 'normal'
+        self.alert_status = self.alert_statuses(
+            [self.current_level], [self.normal_level], [self.warning_level], [self.danger_level]
+        )[0]
         self.save()
     
     def __str__(self):
@@ -141,10 +297,52 @@ class UserAlert(models.Model):
         default='info'
     )
     is_read = models.BooleanField(default=False)
+    # Identifies repeats of the same alert (e.g. one gauge going critical) for fan-out dedupe
+    dedupe_key = models.CharField(max_length=200, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
+    # When the alert was collected into an email/SMS digest (null while pending)
+    notified_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['dedupe_key', 'created_at'], name='alert_dedupe_idx'),
+            # A user's unread alerts, newest first
+            models.Index(fields=['user', 'is_read', '-created_at'], name='alert_inbox_idx'),
+            # Only alerts still waiting for a digest
+            models.Index(
+                fields=['user', 'created_at'], name='alert_pending_digest_idx', condition=Q(notified_at__isnull=True)
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.alert_type} - {self.severity}"
+
+class NotificationDigest(models.Model):
+    """One coalesced message of a user's alerts, queued for delivery over one transport"""
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_digests')
+    transport = models.CharField(max_length=20)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    alert_count = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'transport', 'next_attempt_at'], name='digest_queue_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.alert_type} - {self.severity}"
\ No newline at end of file
+        return f"{self.user} - {self.transport} - {self.status}"
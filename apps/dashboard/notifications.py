@@ -0,0 +1,292 @@
+"""Email/SMS delivery of alerts as coalesced digests.
+
+Alerts aren't sent one by one. Once a user's oldest undelivered alert is
+``NOTIFICATION_DIGEST['window_seconds']`` old, everything they have
+pending is collected into one ``NotificationDigest`` per transport, so a
+storm that raises a dozen alerts costs each user one message. Digests
+queue in the database and are sent in batches by pluggable transports,
+each with its own rate limit, and failed sends are retried with backoff.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import NotificationDigest, UserAlert
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_ORDER = {'danger': 0, 'warning': 1, 'info': 2}
+
+
+class Transport:
+    """Base class for delivery transports, configured by a NOTIFICATION_TRANSPORTS entry"""
+
+    recipient_field = None
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+        self.batch_size = options.get('batch_size', 50)
+        self.recipient_field = options.get('recipient_field', self.recipient_field)
+        self.limiter = RateLimiter(options.get('rate_per_second'))
+
+    def recipient(self, user):
+        """Address to send a user's digests to, or None if they can't be reached this way"""
+        return getattr(user, self.recipient_field, None) or None
+
+    def send_batch(self, digests):
+        """Send the digests; returns an error message (or None on success) for each, in order"""
+        raise NotImplementedError
+
+
+class EmailTransport(Transport):
+    """Sends digests through Django's email backend, one connection per batch"""
+
+    recipient_field = 'email'
+
+    def send_batch(self, digests):
+        errors = []
+        with get_connection(fail_silently=False) as connection:
+            for digest in digests:
+                message = EmailMessage(digest.subject, digest.body, to=[digest.recipient], connection=connection)
+                try:
+                    message.send()
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(str(e) or type(e).__name__)
+        return errors
+
+
+class FileTransport(Transport):
+    """Appends digests as JSON lines to a local file, for development and testing"""
+
+    def send_batch(self, digests):
+        path = self.options['path']
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        max_length = self.options.get('max_length')
+        with open(path, 'a', encoding='utf-8') as outbox:
+            for digest in digests:
+                text = f"{digest.subject}\n{digest.body}"
+                if max_length and len(text) > max_length:
+                    text = text[:max_length - 1] + '…'
+                outbox.write(json.dumps({
+                    'to': digest.recipient,
+                    'text': text,
+                    'sent_at': timezone.now().isoformat(),
+                }) + '\n')
+        return [None] * len(digests)
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` messages per second in this process, with up to one second of burst"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate or 0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.tokens -= count
+            self.updated = now
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+class NotificationService:
+    _transports = None
+
+    @classmethod
+    def transports(cls):
+        if cls._transports is None:
+            cls._transports = {
+                name: import_string(options['BACKEND'])(name, options)
+                for name, options in settings.NOTIFICATION_TRANSPORTS.items()
+            }
+        return cls._transports
+
+    @classmethod
+    def collect(cls, now=None, chunk_size=500):
+        """Coalesce pending alerts into digests for users whose oldest one has waited a full window.
+
+        Returns the number of digests queued.
+        """
+        now = now or timezone.now()
+        cutoff = now - timedelta(seconds=settings.NOTIFICATION_DIGEST['window_seconds'])
+        user_ids = list(
+            UserAlert.objects.filter(notified_at__isnull=True)
+            .values('user')
+            .annotate(oldest=Min('created_at'))
+            .filter(oldest__lte=cutoff)
+            .values_list('user', flat=True)
+        )
+
+        queued = 0
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            with transaction.atomic():
+                # Alerts raised after ``now`` wait for the next digest
+                pending = UserAlert.objects.filter(user_id__in=chunk, notified_at__isnull=True, created_at__lte=now)
+                alerts = {}
+                for alert in pending.order_by('created_at'):
+                    alerts.setdefault(alert.user_id, []).append(alert)
+
+                digests = []
+                users = get_user_model().objects.filter(pk__in=alerts, is_active=True, notifications_enabled=True)
+                for user in users:
+                    subject, body = cls.render(alerts[user.pk])
+                    for transport in cls.transports().values():
+                        recipient = transport.recipient(user)
+                        if recipient:
+                            digests.append(NotificationDigest(
+                                user=user,
+                                transport=transport.name,
+                                recipient=recipient,
+                                subject=subject,
+                                body=body,
+                                alert_count=len(alerts[user.pk]),
+                                next_attempt_at=now
+                            ))
+                NotificationDigest.objects.bulk_create(digests, batch_size=500)
+                # Alerts of users who opted out are marked too, so they aren't rescanned
+                pending.update(notified_at=now)
+            queued += len(digests)
+
+        if queued:
+            logger.info(f"Queued {queued} notification digests for {len(user_ids)} users")
+        return queued
+
+    @classmethod
+    def render(cls, alerts):
+        """Subject and body of a digest of ``alerts``, most severe first"""
+        alerts = sorted(alerts, key=lambda alert: (SEVERITY_ORDER.get(alert.severity, 3), alert.created_at))
+        count = len(alerts)
+        subject = f"Monsoon Tracker: {count} new alert{'s' if count != 1 else ''}"
+        if alerts[0].severity == 'danger':
+            subject = f"{subject} (urgent)"
+        lines = [
+            f"[{alert.get_severity_display().upper()}] {alert.get_alert_type_display()}: {alert.message} "
+            f"({timezone.localtime(alert.created_at):%d %b %H:%M})"
+            for alert in alerts
+        ]
+        return subject, '\n'.join(lines)
+
+    @classmethod
+    def deliver(cls, now=None, max_batches=None):
+        """Send due digests through their transports; returns {'sent': n, 'failed': n, 'retrying': n}"""
+        now = now or timezone.now()
+        totals = {'sent': 0, 'failed': 0, 'retrying': 0}
+        for transport in cls.transports().values():
+            batches = 0
+            # Claimed digests move past ``now``, so each is tried at most once per call
+            while max_batches is None or batches < max_batches:
+                digests = cls._claim(transport, now)
+                if not digests:
+                    break
+                batches += 1
+                transport.limiter.acquire(len(digests))
+                try:
+                    errors = transport.send_batch(digests)
+                except Exception as e:
+                    logger.exception(f"{transport.name} transport failed a batch of {len(digests)}: {str(e)}")
+                    errors = [str(e) or type(e).__name__] * len(digests)
+                for outcome, count in cls._record(digests, errors, now).items():
+                    totals[outcome] += count
+
+        if any(totals.values()):
+            logger.info(
+                f"Notification digests: {totals['sent']} sent, {totals['retrying']} to retry, "
+                f"{totals['failed']} failed"
+            )
+        return totals
+
+    @classmethod
+    def _claim(cls, transport, now):
+        """Lease the next batch of due digests so concurrent dispatchers don't send them twice"""
+        with transaction.atomic():
+            digests = list(
+                NotificationDigest.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', transport=transport.name, next_attempt_at__lte=now)
+                .order_by('next_attempt_at', 'pk')[:transport.batch_size]
+            )
+            if digests:
+                # A dispatcher that dies mid-send leaves them to be retried after the lease
+                NotificationDigest.objects.filter(pk__in=[digest.pk for digest in digests]).update(
+                    next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_DIGEST['retry_seconds'])
+                )
+        return digests
+
+    @classmethod
+    def _record(cls, digests, errors, now):
+        options = settings.NOTIFICATION_DIGEST
+        outcomes = {'sent': 0, 'failed': 0, 'retrying': 0}
+        for digest, error in zip(digests, errors):
+            digest.attempts += 1
+            if error is None:
+                digest.status, digest.sent_at, digest.last_error = 'sent', now, ''
+                outcomes['sent'] += 1
+                continue
+            digest.last_error = error
+            if digest.attempts >= options['max_attempts']:
+                digest.status = 'failed'
+                outcomes['failed'] += 1
+                logger.warning(f"Giving up on {digest.transport} digest {digest.pk} to {digest.recipient}: {error}")
+            else:
+                digest.next_attempt_at = now + timedelta(
+                    seconds=options['retry_seconds'] * 2 ** (digest.attempts - 1)
+                )
+                outcomes['retrying'] += 1
+        NotificationDigest.objects.bulk_update(
+            digests, ['status', 'attempts', 'sent_at', 'last_error', 'next_attempt_at'], batch_size=500
+        )
+        return outcomes
+
+
+class NotificationDispatcher:
+    """Collects and delivers digests every tick until stopped"""
+
+    def __init__(self, tick=None):
+        self.tick = tick or settings.SCHEDULER_TICK_SECONDS
+        self.stopped = False
+
+    def run_forever(self):
+        logger.info("Notification dispatcher started")
+        while not self.stopped:
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception(f"Notification dispatcher tick failed: {str(e)}")
+            finally:
+                close_old_connections()
+
+            remaining = self.tick - (time.monotonic() - started)
+            while remaining > 0 and not self.stopped:
+                time.sleep(min(1, remaining))
+                remaining -= 1
+        logger.info("Notification dispatcher stopped")
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def run_once(self):
+        queued = NotificationService.collect()
+        totals = NotificationService.deliver()
+        return {'queued': queued, **totals}
@@ -0,0 +1,188 @@
+"""Rolling rainfall totals per city over 1, 3, 24 and 72 hours.
+
+The provider reports rain as the amount that fell over the last hour
+(``rain.1h``) or, for some stations, the last three hours (``rain.3h``).
+Readings arrive more often than that, so their windows overlap and can't
+simply be summed.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .alerts import AlertFanout
+from .models import WeatherData
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = (1, 3, 24, 72)
+
+
+def hour_bin(timestamp):
+    """Clock hour that most of the hour ending at ``timestamp`` fell in"""
+    return int((timestamp - 1800) // 3600)
+
+
+class RainfallAccumulator:
+    """Hourly rainfall bins for one city with a running total per window.
+
+    A reading sets the bins its window mostly covers: a 1h reading sets one
+    hour, a 3h reading spreads evenly over three but never overwrites an
+    hour that a 1h reading measured directly. A newer reading for the same
+    hour replaces the older one instead of adding to it. Each reading
+    touches at most three bins and moves every total by the change, and
+    advancing the clock drops one expired bin per window per hour, so
+    updates are O(1).
+    """
+
+    SPAN = max(WINDOWS)
+
+    def __init__(self):
+        self.amounts = np.zeros(self.SPAN)                # indexed by hour % SPAN
+        self.direct = np.zeros(self.SPAN, dtype=bool)     # set by a 1h reading
+        self.head = None                                  # newest hour in the bins
+        self.totals = dict.fromkeys(WINDOWS, 0.0)
+        self.latest = None                                # timestamp of the newest reading
+        self.last_pk = 0
+        self.synced_at = 0.0
+
+    def add(self, timestamp, amount, window=1):
+        end = hour_bin(timestamp)
+        if self.head is None or end > self.head:
+            self.advance(end)
+        if self.latest is None or timestamp > self.latest:
+            self.latest = timestamp
+
+        amount = amount or 0.0
+        if window == 1:
+            self._set(end, amount, direct=True)
+        else:
+            for hour in range(end - window + 1, end + 1):
+                if not self.direct[hour % self.SPAN]:
+                    self._set(hour, amount / window, direct=False)
+
+    def advance(self, hour):
+        """Move the newest hour forward, dropping hours that fall out of each window"""
+        if self.head is None or hour - self.head >= self.SPAN:
+            self.amounts[:] = 0.0
+            self.direct[:] = False
+            self.totals = dict.fromkeys(WINDOWS, 0.0)
+            self.head = hour
+            return
+        while self.head < hour:
+            self.head += 1
+            for window in WINDOWS:
+                self.totals[window] -= self.amounts[(self.head - window) % self.SPAN]
+            # The slot for the new hour last held the hour that just left the longest window
+            self.amounts[self.head % self.SPAN] = 0.0
+            self.direct[self.head % self.SPAN] = False
+
+    def totals_at(self, timestamp):
+        """Totals in mm for each window ending at ``timestamp``"""
+        self.advance(hour_bin(timestamp))
+        return {window: round(max(float(total), 0.0), 2) for window, total in self.totals.items()}
+
+    def _set(self, hour, amount, direct):
+        if hour <= self.head - self.SPAN:
+            return
+        slot = hour % self.SPAN
+        change = amount - self.amounts[slot]
+        self.amounts[slot] = amount
+        self.direct[slot] = self.direct[slot] or direct
+        for window in WINDOWS:
+            if hour > self.head - window:
+                self.totals[window] += change
+
+
+class RainfallService:
+    """Per-worker accumulators, kept current like the sparkline buffers"""
+
+    _accumulators = {}  # city id -> RainfallAccumulator
+    _lock = threading.Lock()
+
+    @classmethod
+    def totals(cls, city):
+        """Rolling totals for a city, e.g. {'1h': 2.5, '3h': 6.0, '24h': 41.2, '72h': 80.0, 'as_of': ...}"""
+        accumulator = cls._accumulators.get(city.pk)
+        if accumulator is None or time.monotonic() - accumulator.synced_at >= settings.SPARKLINE_SYNC_SECONDS:
+            accumulator = cls._sync(city.pk)
+
+        with cls._lock:
+            totals = accumulator.totals_at(time.time())
+            latest = accumulator.latest
+        result = {f"{window}h": total for window, total in totals.items()}
+        result['as_of'] = datetime.fromtimestamp(latest, tz=dt_timezone.utc).isoformat() if latest else None
+        return result
+
+    @classmethod
+    def breaches(cls, city):
+        """Windows whose total has reached its RAINFALL_ALERT_THRESHOLDS value, as (window, total, threshold)"""
+        totals = cls.totals(city)
+        return [
+            (window, totals[window], threshold)
+            for window, threshold in settings.RAINFALL_ALERT_THRESHOLDS.items()
+            if totals.get(window) is not None and totals[window] >= threshold
+        ]
+
+    @classmethod
+    def alert(cls, observations):
+        """Alert residents of each observed city whose rolling rainfall has reached a threshold.
+
+        Each window alerts a city at most once per ALERT_FANOUT cooldown.
+        Returns the number of alerts created.
+        """
+        cities = {observation.city_ref_id: observation for observation in observations if observation.city_ref_id}
+        created = 0
+        for observation in cities.values():
+            for window, total, threshold in cls.breaches(observation.city_ref):
+                severity = 'danger' if total >= 2 * threshold else 'warning'
+                message = (
+                    f"Heavy rain in {observation.city}: {total:.1f} mm in the last {window}, "
+                    f"above the {threshold:g} mm alert level"
+                )
+                logger.info(f"Rainfall threshold reached for {observation.city}: {total:.1f} mm in {window}")
+                created += AlertFanout.send(
+                    observation.city_ref_id, 'weather', message, severity, dedupe_key=f"rainfall:{window}"
+                )['created']
+        return created
+
+    @classmethod
+    def add(cls, observations):
+        """Fold freshly saved weather readings into accumulators this worker already holds"""
+        with cls._lock:
+            for observation in observations:
+                accumulator = cls._accumulators.get(observation.city_ref_id)
+                if accumulator is not None and observation.pk > accumulator.last_pk:
+                    accumulator.add(
+                        observation.recorded_at.timestamp(), observation.rainfall, observation.rainfall_window
+                    )
+                    accumulator.last_pk = observation.pk
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._accumulators = {}
+
+    @classmethod
+    def _sync(cls, city_id):
+        """Build a city's accumulator, or fold in only the readings saved since the last sync"""
+        accumulator = cls._accumulators.get(city_id) or RainfallAccumulator()
+        # 3h readings up to three hours past the longest window still reach into it
+        since = timezone.now() - timedelta(hours=RainfallAccumulator.SPAN + 3)
+        rows = list(
+            WeatherData.objects.filter(city_ref_id=city_id, recorded_at__gte=since, pk__gt=accumulator.last_pk)
+            .order_by('recorded_at', 'pk')
+            .values_list('pk', 'recorded_at', 'rainfall', 'rainfall_window')
+        )
+
+        with cls._lock:
+            for pk, recorded_at, rainfall, window in rows:
+                accumulator.add(recorded_at.timestamp(), rainfall, window)
+                accumulator.last_pk = max(accumulator.last_pk, pk)
+            accumulator.synced_at = time.monotonic()
+            cls._accumulators[city_id] = accumulator
+        return accumulator
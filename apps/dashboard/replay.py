@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .http_client import TimeoutHTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that identify the caller rather than the data; never recorded
+SECRET_PARAMS = {'appid', 'api_key', 'key'}
+
+
+class Cassette:
+    """Recorded provider responses stored as one JSON file per distinct request"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def request_key(self, method, url):
+        """Stable description of a request: method, host, path and sorted query without secrets"""
+        parts = urlsplit(url)
+        params = sorted(
+            (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if name not in SECRET_PARAMS
+        )
+        return f"{method} {parts.netloc}{parts.path}?{urlencode(params)}"
+
+    def path_for(self, method, url):
+        key = self.request_key(method, url)
+        host = urlsplit(url).netloc or 'unknown'
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.directory / host / f"{digest}.json"
+
+    def save(self, request, response):
+        path = self.path_for(request.method, request.url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        record = {
+            'request': self.request_key(request.method, request.url),
+            'status': response.status_code,
+            'headers': {'Content-Type': response.headers.get('Content-Type', 'application/json')},
+            'body': response.text,
+            'elapsed_ms': round(response.elapsed.total_seconds() * 1000, 1),
+        }
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+    def load(self, method, url):
+        path = self.path_for(method, url)
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class RecordingAdapter(TimeoutHTTPAdapter):
+    """Talks to the real provider and writes every response to a cassette"""
+
+    def __init__(self, *args, cassette=None, **kwargs):
+        self.cassette = cassette
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        try:
+            self.cassette.save(request, response)
+        except OSError as e:
+            logger.error(f"Could not record {request.url}: {str(e)}")
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Serves recorded responses with simulated latency, errors and a throughput cap"""
+
+    def __init__(self, cassette=None, latency_ms=0, jitter_ms=0, error_rate=0.0, max_rps=0, **kwargs):
+        self.cassette = cassette
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self._next_slot = 0.0
+        self._slot_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self._throttle()
+
+        delay_ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        if self.error_rate and random.random() < self.error_rate:
+            return self._build(request, 503, {'message': 'Simulated provider error'})
+
+        record = self.cassette.load(request.method, request.url)
+        if record is None:
+            logger.warning(f"No recording for {self.cassette.request_key(request.method, request.url)}")
+            return self._build(request, 404, {'message': 'Not recorded'})
+
+        return self._build(request, record['status'], record['body'], record['headers'])
+
+    def close(self):
+        pass
+
+    def _throttle(self):
+        """Space requests at least 1/max_rps seconds apart across all threads"""
+        if not self.max_rps:
+            return
+        with self._slot_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.max_rps
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _build(self, request, status, body, headers=None):
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers or {'Content-Type': 'application/json'})
+        response._content = (body if isinstance(body, str) else json.dumps(body)).encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'Simulated' if status == 503 else ('OK' if status < 400 else 'Not Found')
+        return response
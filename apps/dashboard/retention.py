@@ -0,0 +1,240 @@
+"""Moves old observations out of the live tables into compressed monthly archives.
+
+Each archive is a NumPy ``.npz`` file of columns holding one kind of
+observation for one city and one calendar month (UTC), stored at
+``<OBSERVATION_ARCHIVE_DIR>/<kind>/city-<id>/<YYYY-MM>.npz``.
+"""
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import aqi as aqi_engine
+from .models import AirQualityData, WeatherData
+
+logger = logging.getLogger(__name__)
+
+WEATHER_COLUMNS = {
+    'id': 'int64',
+    'city': 'str',
+    'country': 'str',
+    'temperature': 'float64',
+    'humidity': 'float64',
+    'pressure': 'float64',
+    'rainfall': 'float64',
+    'rainfall_window': 'int64',
+    'wind_speed': 'float64',
+    'weather_description': 'str',
+    'recorded_at': 'datetime64[us]',
+}
+
+AIR_QUALITY_COLUMNS = {
+    'id': 'int64',
+    'city': 'str',
+    'country': 'str',
+    'aqi': 'int64',
+    **{pollutant: 'float64' for pollutant in aqi_engine.POLLUTANTS},
+    'recorded_at': 'datetime64[us]',
+}
+
+
+def _month_start(moment):
+    return moment.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+class RetentionService:
+    KINDS = {
+        'weather': (WeatherData, WEATHER_COLUMNS),
+        'air_quality': (AirQualityData, AIR_QUALITY_COLUMNS),
+    }
+
+    @classmethod
+    def cutoff(cls, days=None):
+        """Start of the oldest day kept live; whole days are archived so rollups never straddle"""
+        days = settings.OBSERVATION_RETENTION_DAYS if days is None else days
+        return timezone.localtime(timezone.now() - timedelta(days=days)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+
+    @classmethod
+    def archive(cls, older_than=None, city=None, batch_size=1000, dry_run=False):
+        """Archive, then delete, observations recorded before ``older_than``.
+
+        Works one city and month at a time, so memory is bounded by the
+        largest month. Returns a dict of kind -> rows archived.
+        """
+        older_than = older_than or cls.cutoff()
+        counts = {}
+        for kind, (model, columns) in cls.KINDS.items():
+            counts[kind] = 0
+            old = model.objects.filter(recorded_at__lt=older_than).exclude(city_ref=None)
+            if city is not None:
+                old = old.filter(city_ref=city)
+
+            for city_id in list(old.order_by().values_list('city_ref', flat=True).distinct()):
+                city_rows = old.filter(city_ref_id=city_id)
+                oldest = city_rows.order_by('recorded_at').values_list('recorded_at', flat=True).first()
+                month = _month_start(oldest)
+                while month < older_than:
+                    rows = list(
+                        city_rows.filter(recorded_at__gte=month, recorded_at__lt=_next_month(month))
+                        .order_by('recorded_at', 'pk')
+                        .values_list(*columns)
+                    )
+                    if rows and not dry_run:
+                        cls._write(kind, city_id, month, rows)
+                        cls._delete(model, [row[0] for row in rows], batch_size)
+                    counts[kind] += len(rows)
+                    month = _next_month(month)
+
+            logger.info(f"Archived {counts[kind]} {kind} observations older than {older_than:%Y-%m-%d}")
+        return counts
+
+    @classmethod
+    def archived_page(cls, kind, city, since=None, until=None, before=None, limit=None):
+        """Up to ``limit`` archived observations for ``city`` in [since, until), newest first.
+
+        ``before`` is a ``(recorded_at, id)`` key, as in a history cursor;
+        only rows that sort after it newest-first are returned.
+        """
+        months = sorted(path.stem for path in cls.path(kind, city.pk, timezone.now()).parent.glob('*.npz'))
+        if not months:
+            return []
+        oldest = datetime.strptime(months[0], '%Y-%m').replace(tzinfo=dt_timezone.utc)
+        if since is not None:
+            oldest = max(oldest, _month_start(since))
+        upper = min(moment for moment in (until, before and before[0], timezone.now()) if moment is not None)
+
+        rows = []
+        month = _month_start(upper)
+        while month >= oldest and (limit is None or len(rows) < limit):
+            rows.extend(sorted(
+                (
+                    row for row in cls._read(kind, city.pk, month)
+                    if (since is None or row['recorded_at'] >= since)
+                    and (until is None or row['recorded_at'] < until)
+                    and (before is None or (row['recorded_at'], row['id']) < before)
+                ),
+                key=lambda row: (row['recorded_at'], row['id']),
+                reverse=True
+            ))
+            month = _month_start(month - timedelta(days=1))
+        return rows[:limit]
+
+    @classmethod
+    def archived(cls, kind, city, since=None, until=None):
+        """Yield archived observations for ``city`` in [since, until), oldest first, a month at a time"""
+        if since is None:
+            # Start at the oldest archive file, if any
+            directory = cls.path(kind, city.pk, timezone.now()).parent
+            months = sorted(path.stem for path in directory.glob('*.npz'))
+            if not months:
+                return
+            since = datetime.strptime(months[0], '%Y-%m').replace(tzinfo=dt_timezone.utc)
+        until = until or timezone.now()
+
+        month = _month_start(since)
+        while month < until:
+            for row in cls._read(kind, city.pk, month):
+                if since <= row['recorded_at'] < until:
+                    yield row
+            month = _next_month(month)
+
+    @classmethod
+    def move_archives(cls, source_id, target_id):
+        """Merge every archived month of city ``source_id`` into ``target_id``'s archives"""
+        for kind, (_, columns) in cls.KINDS.items():
+            directory = cls.path(kind, source_id, timezone.now()).parent
+            for path in sorted(directory.glob('*.npz')):
+                month = datetime.strptime(path.stem, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+                rows = [tuple(row[name] for name in columns) for row in cls._read(kind, source_id, month)]
+                if rows:
+                    cls._write(kind, target_id, month, rows)
+                path.unlink()
+            if directory.exists():
+                directory.rmdir()
+
+    @classmethod
+    def path(cls, kind, city_id, month):
+        return Path(settings.OBSERVATION_ARCHIVE_DIR) / kind / f"city-{city_id}" / f"{month:%Y-%m}.npz"
+
+    @classmethod
+    def _write(cls, kind, city_id, month, rows):
+        """Merge rows into the month's archive file, replacing it atomically"""
+        columns = cls.KINDS[kind][1]
+        values = list(zip(*rows))
+        arrays = {}
+        for (name, dtype), column in zip(columns.items(), values):
+            if dtype == 'float64':
+                column = [np.nan if value is None else value for value in column]
+            elif dtype.startswith('datetime64'):
+                column = [value.astimezone(dt_timezone.utc).replace(tzinfo=None) for value in column]
+            arrays[name] = np.array(column, dtype=dtype)
+
+        path = cls.path(kind, city_id, month)
+        if path.exists():
+            # A previous run may have archived part of this month already
+            with np.load(path) as existing:
+                arrays = {
+                    name: np.concatenate([cls._column(kind, existing, name), arrays[name]]) for name in columns
+                }
+        _, unique = np.unique(arrays['id'], return_index=True)
+        order = unique[np.argsort(arrays['recorded_at'][unique], kind='stable')]
+        arrays = {name: array[order] for name, array in arrays.items()}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def _read(cls, kind, city_id, month):
+        path = cls.path(kind, city_id, month)
+        if not path.exists():
+            return []
+
+        columns = cls.KINDS[kind][1]
+        with np.load(path) as archive:
+            values = {}
+            for name, dtype in columns.items():
+                column = cls._column(kind, archive, name)
+                if dtype == 'float64':
+                    values[name] = [None if np.isnan(value) else value for value in column.tolist()]
+                elif dtype.startswith('datetime64'):
+                    values[name] = [value.replace(tzinfo=dt_timezone.utc) for value in column.tolist()]
+                else:
+                    values[name] = column.tolist()
+        return [dict(zip(columns, row)) for row in zip(*values.values())]
+
+    @classmethod
+    def _column(cls, kind, archive, name):
+        """A column of an open archive, filled with the field's default if the file predates it"""
+        if name in archive.files:
+            return archive[name]
+        model, columns = cls.KINDS[kind]
+        length = len(archive['id'])
+        return np.full(length, model._meta.get_field(name).get_default(), dtype=columns[name])
+
+    @classmethod
+    def _delete(cls, model, ids, batch_size):
+        # Short transactions keep the table writable while a large backlog drains
+        for start in range(0, len(ids), batch_size):
+            with transaction.atomic():
+                model.objects.filter(pk__in=ids[start:start + batch_size]).delete()
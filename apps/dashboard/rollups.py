@@ -0,0 +1,159 @@
+"""Hourly and daily min/max/sum rollups of weather and air quality readings.
+
+Rollups are folded in as observations are saved, so long-range charts read
+one row per metric and bucket instead of every raw reading.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import aqi as aqi_engine
+from .models import AirQualityData, ObservationRollup, WeatherData
+
+WEATHER_METRICS = ('temperature', 'humidity', 'rainfall')
+AIR_QUALITY_METRICS = ('aqi',) + aqi_engine.POLLUTANTS
+
+
+class RollupService:
+    RESOLUTIONS = ('hour', 'day')
+
+    @classmethod
+    def bucket_start(cls, moment, resolution):
+        """Start of the hour or day (in the site time zone) containing ``moment``"""
+        moment = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+        if resolution == 'day':
+            moment = moment.replace(hour=0)
+        return moment
+
+    @classmethod
+    def add(cls, weather=(), air_quality=()):
+        """Fold newly saved observations into their hourly and daily buckets"""
+        deltas = {}  # (city id, resolution, metric, bucket start) -> [count, min, max, total]
+        for observations, metrics in ((weather, WEATHER_METRICS), (air_quality, AIR_QUALITY_METRICS)):
+            for observation in observations:
+                if observation.city_ref_id is None:
+                    continue
+                for resolution in cls.RESOLUTIONS:
+                    start = cls.bucket_start(observation.recorded_at, resolution)
+                    for metric in metrics:
+                        value = getattr(observation, metric)
+                        if value is None:
+                            continue
+                        key = (observation.city_ref_id, resolution, metric, start)
+                        delta = deltas.get(key)
+                        if delta is None:
+                            deltas[key] = [1, value, value, value]
+                        else:
+                            delta[0] += 1
+                            delta[1] = min(delta[1], value)
+                            delta[2] = max(delta[2], value)
+                            delta[3] += value
+
+        if deltas:
+            cls._merge(deltas)
+        return len(deltas)
+
+    @classmethod
+    def _merge(cls, deltas):
+        with transaction.atomic():
+            # Create missing buckets empty first, so concurrent writers only
+            # ever race on the locked read-modify-write below, never the insert
+            ObservationRollup.objects.bulk_create(
+                [
+                    ObservationRollup(city_id=city_id, resolution=resolution, metric=metric, bucket_start=start)
+                    for city_id, resolution, metric, start in deltas
+                ],
+                ignore_conflicts=True
+            )
+            rows = ObservationRollup.objects.select_for_update().filter(
+                city_id__in={key[0] for key in deltas},
+                bucket_start__in={key[3] for key in deltas}
+            )
+
+            changed = []
+            for row in rows:
+                delta = deltas.get((row.city_id, row.resolution, row.metric, row.bucket_start))
+                if delta is None:
+                    continue
+                count, minimum, maximum, total = delta
+                row.count += count
+                row.minimum = minimum if row.minimum is None else min(row.minimum, minimum)
+                row.maximum = maximum if row.maximum is None else max(row.maximum, maximum)
+                row.total += total
+                changed.append(row)
+            ObservationRollup.objects.bulk_update(changed, ['count', 'minimum', 'maximum', 'total'], batch_size=500)
+
+    @classmethod
+    def reassign(cls, source, target):
+        """Fold every bucket of city ``source`` into the same bucket of ``target``"""
+        deltas = {
+            (target.pk, rollup.resolution, rollup.metric, rollup.bucket_start):
+                [rollup.count, rollup.minimum, rollup.maximum, rollup.total]
+            for rollup in ObservationRollup.objects.filter(city=source, count__gt=0)
+        }
+        with transaction.atomic():
+            if deltas:
+                cls._merge(deltas)
+            ObservationRollup.objects.filter(city=source).delete()
+
+    @classmethod
+    def series(cls, city, metrics, resolution, since=None, until=None):
+        """Buckets for ``city`` oldest first, each with min/max/mean/sum/count per metric"""
+        rows = ObservationRollup.objects.filter(city=city, resolution=resolution, metric__in=metrics)
+        if since is not None:
+            rows = rows.filter(bucket_start__gte=cls.bucket_start(since, resolution))
+        if until is not None:
+            rows = rows.filter(bucket_start__lte=until)
+
+        points = {}
+        for row in rows.order_by('bucket_start'):
+            point = points.setdefault(row.bucket_start, {'bucket_start': row.bucket_start.isoformat()})
+            point[row.metric] = {
+                'min': row.minimum,
+                'max': row.maximum,
+                'mean': row.mean,
+                'sum': row.total,
+                'count': row.count,
+            }
+        return list(points.values())
+
+    @classmethod
+    def rebuild(cls, city=None, since=None, chunk_size=5000):
+        """Recompute rollups from the raw tables, e.g. after a backfill or bulk delete.
+
+        Returns the number of observations folded in.
+        """
+        oldest = [
+            model.objects.filter(**({'city_ref': city} if city is not None else {}))
+            .exclude(city_ref=None).order_by('recorded_at').values_list('recorded_at', flat=True).first()
+            for model in (WeatherData, AirQualityData)
+        ]
+        oldest = [moment for moment in oldest if moment is not None]
+        if not oldest:
+            return 0
+        # Archived periods have no raw rows left to rebuild from, so keep their
+        # buckets; whole days are rebuilt so daily buckets are never left partial
+        since = min(oldest) if since is None else max(since, min(oldest))
+        since = cls.bucket_start(since, 'day')
+
+        rollups = ObservationRollup.objects.filter(bucket_start__gte=since)
+        if city is not None:
+            rollups = rollups.filter(city=city)
+
+        folded = 0
+        with transaction.atomic():
+            rollups.delete()
+            for model, kind in ((WeatherData, 'weather'), (AirQualityData, 'air_quality')):
+                observations = model.objects.exclude(city_ref=None)
+                if city is not None:
+                    observations = observations.filter(city_ref=city)
+                observations = observations.filter(recorded_at__gte=since)
+
+                last_pk = 0
+                while True:
+                    chunk = list(observations.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+                    if not chunk:
+                        break
+                    last_pk = chunk[-1].pk
+                    cls.add(**{kind: chunk})
+                    folded += len(chunk)
+        return folded
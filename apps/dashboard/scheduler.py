@@ -0,0 +1,87 @@
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .ingestion import IngestionService
+from .utils import normalize_city
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """Keeps weather, air quality and forecasts warm for every city users live in"""
+
+    def __init__(self, intervals=None, tick=None):
+        self.intervals = intervals or settings.REFRESH_INTERVALS
+        self.tick = tick or settings.SCHEDULER_TICK_SECONDS
+        self.next_due = {}  # (kind, normalized city) -> monotonic time
+        self.stopped = False
+
+    def run_forever(self):
+        """Refresh due cities every tick until ``stop`` is called"""
+        logger.info(f"Refresh scheduler started, intervals: {self.intervals}")
+        while not self.stopped:
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception(f"Refresh scheduler tick failed: {str(e)}")
+            finally:
+                close_old_connections()
+
+            remaining = self.tick - (time.monotonic() - started)
+            while remaining > 0 and not self.stopped:
+                time.sleep(min(1, remaining))
+                remaining -= 1
+        logger.info("Refresh scheduler stopped")
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def run_once(self):
+        """Refresh every city whose data is due, busiest cities first"""
+        cities = self.active_cities()
+        reports = {}
+        for kind, interval in self.intervals.items():
+            now = time.monotonic()
+            due = [
+                city for city in cities
+                if self.next_due.get((kind, normalize_city(city)), 0) <= now
+            ]
+            if not due:
+                continue
+
+            report = IngestionService.ingest(due, kinds=[kind])
+            for result in report['results']:
+                key = (kind, normalize_city(result['city']))
+                # Failed cities are retried on the next tick rather than after a full interval
+                self.next_due[key] = now + (interval if result['success'] else self.tick)
+            reports[kind] = report
+            logger.info(
+                f"Refreshed {kind} for {report['succeeded']}/{len(due)} cities "
+                f"in {report['elapsed_ms']}ms"
+            )
+        return reports
+
+    def active_cities(self):
+        """Cities referenced by active users, ordered by number of users"""
+        User = get_user_model()
+        users = User.objects.filter(is_active=True).exclude(city__isnull=True).exclude(city='')
+        if settings.SCHEDULER_ACTIVE_USER_DAYS:
+            cutoff = timezone.now() - timedelta(days=settings.SCHEDULER_ACTIVE_USER_DAYS)
+            users = users.filter(last_login__gte=cutoff)
+
+        counts = Counter()
+        names = {}
+        for city in users.values_list('city', flat=True).iterator():
+            key = normalize_city(city)
+            if key:
+                counts[key] += 1
+                names.setdefault(key, ' '.join(city.split()))
+        return [names[key] for key, _ in counts.most_common()]
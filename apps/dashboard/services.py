@@ -1,17 +1,81 @@
 import requests
 from django.conf import settings
-from datetime import datetime, timedelta
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
 import logging
-from .models import WeatherData, AirQualityData
+import time
+from . import aqi as aqi_engine
+from .alerts import AlertFanout
+from .anomalies import AnomalyDetector
+from .broadcast import Broadcaster
+from .cache import make_key, peek, read_through, single_flight, store
+from .cities import CityRegistry
+from .http_client import ProviderClient
+from .models import WeatherData, AirQualityData, ForecastPoint, LatestObservation, WaterLevel
+from .rainfall import RainfallService
+from .rollups import RollupService
+from .sparklines import SparklineStore
+from .utils import normalize_city
 
 logger = logging.getLogger(__name__)
 
 class WeatherService:
     BASE_URL = "http://api.openweathermap.org/data/2.5"
+    PROVIDER = 'openweather'
     
     @classmethod
     def get_current_weather(cls, city):
         """Fetch current weather data from OpenWeatherMap API"""
+        try:
+            url = f"{cls.BASE_URL}/weather"
+            params = {
+                **cls._location_params(city),
+                'appid': settings.OPENWEATHER_API_KEY,
+                'units': 'metric'
+            }
+            
+            response = ProviderClient.get(cls.PROVIDER, url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            return cls._parse_current_weather(data)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Weather API error for {city}: {str(e)}")
+            return None
+        except KeyError as e:
+            logger.error(f"Weather data parsing error: {str(e)}")
+            return None
+    
+    @classmethod
+    def get_current_weather_group(cls, provider_ids):
+        """Fetch current weather for several registered cities in one call, keyed by provider id"""
+        try:
+            url = f"{cls.BASE_URL}/group"
+            params = {
+                'id': ','.join(str(provider_id) for provider_id in provider_ids),
+                'appid': settings.OPENWEATHER_API_KEY,
+                'units': 'metric'
+            }
+            
+            response = ProviderClient.get(cls.PROVIDER, url, params=params)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Weather group API error for ids {params['id']}: {str(e)}")
+            return {}
+        
+        weather_by_id = {}
+        for item in data.get('list', []):
+            try:
+                weather_by_id[item['id']] = cls._parse_current_weather(item)
+            except KeyError as e:
+                logger.error(f"Weather data parsing error: {str(e)}")
+        return weather_by_id
+    
+    @classmethod
+    def resolve_city(cls, city):
+        """Look up a city's provider id, country and coordinates"""
         try:
             url = f"{cls.BASE_URL}/weather"
             params = {
@@ -20,48 +84,188 @@ class WeatherService:
                 'units': 'metric'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = ProviderClient.get(cls.PROVIDER, url, params=params)
             response.raise_for_status()
             data = response.json()
             
-            weather_data = {
-                'city': data['name'],
+            return {
+                'name': data['name'],
                 'country': data['sys']['country'],
-                'temperature': data['main']['temp'],
-                'humidity': data['main']['humidity'],
-                'pressure': data['main']['pressure'],
-                'wind_speed': data['wind']['speed'],
-                'weather_description': data['weather'][0]['description'],
-                'rainfall': cls._extract_rainfall(data)
+                'latitude': data['coord']['lat'],
+                'longitude': data['coord']['lon'],
+                'openweather_id': data['id'],
             }
-            
-            return weather_data
         except requests.exceptions.RequestException as e:
-            logger.error(f"Weather API error for {city}: {str(e)}")
+            logger.error(f"City lookup error for {city}: {str(e)}")
             return None
         except KeyError as e:
-            logger.error(f"Weather data parsing error: {str(e)}")
+            logger.error(f"City lookup parsing error for {city}: {str(e)}")
             return None
     
+    @classmethod
+    def _location_params(cls, city):
+        """Query by provider id when the city is registered, otherwise by name"""
+        registered = CityRegistry.lookup(city)
+        if registered is not None and registered.openweather_id:
+            return {'id': registered.openweather_id}
+        return {'q': city}
+    
+    @classmethod
+    def _parse_current_weather(cls, data):
+        return {
+            'city': data['name'],
+            'country': data['sys']['country'],
+            'temperature': data['main']['temp'],
+            'humidity': data['main']['humidity'],
+            'pressure': data['main']['pressure'],
+            'wind_speed': data['wind']['speed'],
+            'weather_description': data['weather'][0]['description'],
+            'rainfall': cls._extract_rainfall(data),
+            'rainfall_window': cls._extract_rainfall_window(data)
+        }
+    
     @classmethod
     def get_forecast(cls, city, days=5):
+        """Weather forecast from stored forecast points, cached until the provider's next 3-hour update"""
+        key = cls._forecast_key(city, days)
+        if not settings.FETCH_ON_READ:
+            return peek(key) or cls.stored_forecast(city, days)
+        
+        return read_through(
+            key,
+            lambda: cls._load_forecast(city, days),
+            fresh_for=cls._seconds_until_next_forecast,
+            stale_for=settings.FORECAST_CACHE_STALE_SECONDS
+        )
+    
+    @classmethod
+    def stored_forecast(cls, city, days=5, issued_at=None):
+        """Upcoming points of the latest stored forecast run (or of the run ``issued_at``)"""
+        city_ref = CityRegistry.lookup(city)
+        if city_ref is None:
+            return []
+        
+        points = ForecastPoint.objects.filter(city=city_ref)
+        if issued_at is None:
+            issued_at = points.order_by('-issued_at').values_list('issued_at', flat=True).first()
+            if issued_at is None:
+                return []
+        
+        upcoming = points.filter(
+            issued_at=issued_at,
+            valid_at__gt=timezone.now() - timedelta(seconds=settings.FORECAST_STEP_SECONDS)
+        ).order_by('valid_at')[:days*8]
+        return [
+            {
+                'datetime': point.valid_at,
+                'temperature': point.temperature,
+                'humidity': point.humidity,
+                'description': point.description,
+                'rainfall': point.rainfall,
+                'wind_speed': point.wind_speed
+            }
+            for point in upcoming
+        ]
+    
+    @classmethod
+    def refresh_forecast(cls, city):
+        """Fetch the forecast once, store it and cache it for every horizon the views use"""
+        forecast_data = cls.fetch_forecast(city, days=max(settings.FORECAST_HORIZONS))
+        if not forecast_data:
+            return None
+        
+        cls.save_forecasts({city: forecast_data})
+        return forecast_data
+    
+    @classmethod
+    def save_forecasts(cls, forecasts, issued_at=None):
+        """Bulk-upsert fetched forecasts ({city name: points}) and warm their cache entries"""
+        issued_at = issued_at or cls._current_forecast_run()
+        points = []
+        for city, forecast_data in forecasts.items():
+            city_ref = CityRegistry.resolve(city)
+            if city_ref is None:
+                continue
+            points.extend(
+                ForecastPoint(
+                    city=city_ref,
+                    issued_at=issued_at,
+                    valid_at=item['datetime'],
+                    temperature=item['temperature'],
+                    humidity=item['humidity'],
+                    rainfall=item['rainfall'],
+                    wind_speed=item['wind_speed'],
+                    description=item['description']
+                )
+                for item in forecast_data
+            )
+        
+        ForecastPoint.objects.bulk_create(
+            points,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['city', 'issued_at', 'valid_at'],
+            update_fields=['temperature', 'humidity', 'rainfall', 'wind_speed', 'description']
+        )
+        
+        for city, forecast_data in forecasts.items():
+            for days in settings.FORECAST_HORIZONS:
+                store(
+                    cls._forecast_key(city, days),
+                    forecast_data[:days*8],
+                    fresh_for=cls._seconds_until_next_forecast,
+                    stale_for=settings.FORECAST_CACHE_STALE_SECONDS
+                )
+        return len(points)
+    
+    @classmethod
+    def _load_forecast(cls, city, days):
+        """Forecast from the current stored run, fetching and storing it if it isn't there yet"""
+        forecast_data = cls.stored_forecast(city, days, issued_at=cls._current_forecast_run())
+        if forecast_data:
+            return forecast_data
+        
+        forecast_data = cls.refresh_forecast(city)
+        return forecast_data[:days*8] if forecast_data else []
+    
+    @classmethod
+    def _forecast_key(cls, city, days):
+        return make_key('forecast', normalize_city(city), days)
+    
+    @classmethod
+    def _current_forecast_run(cls):
+        """Issue time of the newest forecast run the provider has published"""
+        step = settings.FORECAST_STEP_SECONDS
+        published = time.time() - settings.FORECAST_PUBLISH_DELAY_SECONDS
+        return datetime.fromtimestamp(published - published % step, tz=dt_timezone.utc)
+    
+    @classmethod
+    def _seconds_until_next_forecast(cls):
+        """Seconds until the provider publishes its next 3-hourly forecast run"""
+        step = settings.FORECAST_STEP_SECONDS
+        # Measured from the same delayed clock as _current_forecast_run, so a run
+        # fetched just before the next one is published isn't pinned for a whole extra step
+        return step - ((time.time() - settings.FORECAST_PUBLISH_DELAY_SECONDS) % step)
+    
+    @classmethod
+    def fetch_forecast(cls, city, days=5):
         """Fetch weather forecast"""
         try:
             url = f"{cls.BASE_URL}/forecast"
             params = {
-                'q': city,
+                **cls._location_params(city),
                 'appid': settings.OPENWEATHER_API_KEY,
                 'units': 'metric'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = ProviderClient.get(cls.PROVIDER, url, params=params)
             response.raise_for_status()
             data = response.json()
             
             forecast_data = []
             for item in data['list'][:days*8]:  # 8 entries per day (3-hour intervals)
                 forecast_data.append({
-                    'datetime': datetime.fromtimestamp(item['dt']),
+                    'datetime': datetime.fromtimestamp(item['dt'], tz=dt_timezone.utc),
                     'temperature': item['main']['temp'],
                     'humidity': item['main']['humidity'],
                     'description': item['weather'][0]['description'],
@@ -79,13 +283,20 @@ class WeatherService:
         """Extract rainfall data from weather response"""
         rain = data.get('rain', {})
         return rain.get('1h', rain.get('3h', 0.0))
+    
+    @classmethod
+    def _extract_rainfall_window(cls, data):
+        """Hours covered by the amount ``_extract_rainfall`` picked"""
+        rain = data.get('rain', {})
+        return 3 if '1h' not in rain and '3h' in rain else 1
 
 class AirQualityService:
     BASE_URL = "https://api.openaq.org/v2"
+    PROVIDER = 'openaq'
     
     @classmethod
     def get_air_quality(cls, city):
-        """Fetch air quality data from OpenAQ API"""
+        """Fetch air quality data from OpenAQ API; None if the provider has nothing for the city"""
         try:
             # First, get the latest measurements for the city
             url = f"{cls.BASE_URL}/latest"
@@ -95,76 +306,85 @@ class AirQualityService:
                 'parameter': ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = ProviderClient.get(cls.PROVIDER, url, params=params)
             response.raise_for_status()
             data = response.json()
             
             if not data.get('results'):
-                return cls._get_mock_air_quality(city)
-            
-            # Process the results
-            measurements = {}
-            for result in data['results']:
-                for measurement in result.get('measurements', []):
-                    param = measurement['parameter']
-                    value = measurement['value']
-                    measurements[param] = value
+                logger.warning(f"No air quality results for {city}")
+                return None
             
-            # Calculate AQI (simplified calculation)
-            aqi = cls._calculate_aqi(measurements)
+            return cls._parse_air_quality(city, data['results'])
             
-            air_quality_data = {
-                'city': city,
-                'country': data['results'][0]['country'] if data['results'] else 'Unknown',
-                'aqi': aqi,
-                'pm25': measurements.get('pm25'),
-                'pm10': measurements.get('pm10'),
-                'o3': measurements.get('o3'),
-                'no2': measurements.get('no2'),
-                'so2': measurements.get('so2'),
-                'co': measurements.get('co')
+        except Exception as e:
+            logger.error(f"Air Quality API error for {city}: {str(e)}")
+            return None
+    
+    @classmethod
+    def get_air_quality_group(cls, cities):
+        """Fetch air quality for several cities in one call, keyed by the names given.
+
+        Cities the provider failed or had no data for map to None, so they
+        are reported as failures and nothing is stored for them.
+        """
+        try:
+            url = f"{cls.BASE_URL}/latest"
+            params = {
+                'city': list(cities),
+                'limit': 100 * len(cities),
+                'parameter': ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
             }
             
-            return air_quality_data
+            response = ProviderClient.get(cls.PROVIDER, url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            
+            results_by_city = {}
+            for result in data.get('results', []):
+                results_by_city.setdefault(normalize_city(result.get('city')), []).append(result)
+            
+            air_quality = {}
+            for city in cities:
+                results = results_by_city.get(normalize_city(city))
+                air_quality[city] = cls._parse_air_quality(city, results) if results else None
+            return air_quality
             
         except Exception as e:
-            logger.error(f"Air Quality API error for {city}: {str(e)}")
-            return cls._get_mock_air_quality(city)
+            logger.error(f"Air Quality group API error for {', '.join(cities)}: {str(e)}")
+            return dict.fromkeys(cities)
     
     @classmethod
-    def _calculate_aqi(cls, measurements):
-        """Calculate AQI based on pollutant measurements"""
-        # Simplified AQI calculation based on PM2.5
-        pm25 = measurements.get('pm25', 25)  # Default moderate value
-        
-        if pm25 <= 12:
-            return int((50/12) * pm25)
-        elif pm25 <= 35.4:
-            return int(50 + ((100-50)/(35.4-12.1)) * (pm25-12.1))
-        elif pm25 <= 55.4:
-            return int(100 + ((150-100)/(55.4-35.5)) * (pm25-35.5))
-        elif pm25 <= 150.4:
-            return int(150 + ((200-150)/(150.4-55.5)) * (pm25-55.5))
-        elif pm25 <= 250.4:
-            return int(200 + ((300-200)/(250.4-150.5)) * (pm25-150.5))
-        else:
-            return int(300 + ((500-300)/(500.4-250.5)) * (pm25-250.5))
-    
-    @classmethod
-    def _get_mock_air_quality(cls, city):
-        """Return mock air quality data when API fails"""
-        import random
+    def _parse_air_quality(cls, city, results):
+        """Combine the latest measurements of all stations in a city"""
+        measurements = {}
+        for result in results:
+            for measurement in result.get('measurements', []):
+                param = measurement['parameter']
+                value = aqi_engine.to_micrograms(param, measurement['value'], measurement.get('unit'))
+                if value is not None:
+                    measurements[param] = value
+        
+        aqi = cls._calculate_aqi(measurements)
+        if aqi is None:
+            logger.warning(f"No AQI pollutants reported for {city}")
+            return None
+        
         return {
             'city': city,
-            'country': 'India',
-            'aqi': random.randint(50, 150),
-            'pm25': random.uniform(15, 45),
-            'pm10': random.uniform(25, 75),
-            'o3': random.uniform(50, 120),
-            'no2': random.uniform(20, 60),
-            'so2': random.uniform(5, 25),
-            'co': random.uniform(1, 5)
+            'country': results[0].get('country') or 'Unknown',
+            'aqi': aqi,
+            'pm25': measurements.get('pm25'),
+            'pm10': measurements.get('pm10'),
+            'o3': measurements.get('o3'),
+            'no2': measurements.get('no2'),
+            'so2': measurements.get('so2'),
+            'co': measurements.get('co')
         }
+    
+    @classmethod
+    def _calculate_aqi(cls, measurements):
+        """Calculate AQI as the highest sub-index of the measured pollutants (µg/m³)"""
+        return aqi_engine.aqi_for(measurements)
 
 class DataService:
     @classmethod
@@ -172,8 +392,10 @@ class DataService:
         """Update weather data for a city"""
         weather_data = WeatherService.get_current_weather(city)
         if weather_data:
-            weather_obj = WeatherData.objects.create(**weather_data)
-            return weather_obj
+            # File the reading under the city that was asked for, not the provider's spelling
+            weather_data['city_ref'] = CityRegistry.resolve(city)
+            weather_objs, _ = cls.save_observations(weather_records=[weather_data])
+            return weather_objs[0]
         return None
     
     @classmethod
@@ -181,38 +403,196 @@ class DataService:
         """Update air quality data for a city"""
         air_quality_data = AirQualityService.get_air_quality(city)
         if air_quality_data:
-            air_quality_obj = AirQualityData.objects.create(**air_quality_data)
-            return air_quality_obj
+            air_quality_data['city_ref'] = CityRegistry.resolve(city)
+            _, air_quality_objs = cls.save_observations(air_quality_records=[air_quality_data])
+            return air_quality_objs[0]
         return None
     
+    @classmethod
+    def save_observations(cls, weather_records=(), air_quality_records=()):
+        """Store batches of weather and air quality readings in one transaction
+
+        Records may carry a ``city_ref``; otherwise it is resolved from ``city``.
+        """
+        weather_objs = [cls._with_city_ref(WeatherData, record) for record in weather_records]
+        air_quality_objs = [cls._with_city_ref(AirQualityData, record) for record in air_quality_records]
+        with transaction.atomic():
+            WeatherData.objects.bulk_create(weather_objs)
+            AirQualityData.objects.bulk_create(air_quality_objs)
+            cls._update_latest('weather', weather_objs)
+            cls._update_latest('air_quality', air_quality_objs)
+            RollupService.add(weather=weather_objs, air_quality=air_quality_objs)
+            AnomalyDetector.observe(weather=weather_objs, air_quality=air_quality_objs)
+            transaction.on_commit(lambda: cls._observations_committed(weather_objs, air_quality_objs))
+        return weather_objs, air_quality_objs
+    
+    @classmethod
+    def _observations_committed(cls, weather_objs, air_quality_objs):
+        """Bring this worker's in-memory views of recent data up to date and notify live dashboards"""
+        SparklineStore.add(weather=weather_objs, air_quality=air_quality_objs)
+        RainfallService.add(weather_objs)
+        Broadcaster.publish_observations(weather=weather_objs, air_quality=air_quality_objs)
+    
+    @classmethod
+    def _update_latest(cls, field, observations):
+        """Point each city's LatestObservation row at its newest reading in the batch"""
+        newest = {}
+        for observation in observations:
+            if observation.city_ref_id is not None:
+                newest[observation.city_ref_id] = observation
+        if newest:
+            LatestObservation.objects.bulk_create(
+                [LatestObservation(city_id=city_id, **{field: obs}) for city_id, obs in newest.items()],
+                update_conflicts=True,
+                unique_fields=['city'],
+                update_fields=[field, 'updated_at']
+            )
+    
+    @classmethod
+    def get_latest(cls, city_ref, since=None):
+        """Newest weather and air quality readings for a city with one primary-key read"""
+        latest = (
+            LatestObservation.objects.select_related('weather', 'air_quality')
+            .filter(pk=city_ref.pk)
+            .first()
+        )
+        weather = latest.weather if latest else None
+        air_quality = latest.air_quality if latest else None
+        if since is not None:
+            if weather and weather.recorded_at < since:
+                weather = None
+            if air_quality and air_quality.recorded_at < since:
+                air_quality = None
+        return weather, air_quality
+    
+    @classmethod
+    def _with_city_ref(cls, model, record):
+        obj = model(**record)
+        if obj.city_ref_id is None:
+            obj.city_ref = CityRegistry.resolve(obj.city)
+        return obj
+    
     @classmethod
     def get_recent_data(cls, city, hours=24):
         """Get recent weather and air quality data"""
-        cutoff_time = datetime.now() - timedelta(hours=hours)
+        cutoff_time = timezone.now() - timedelta(hours=hours)
         
-        weather_data = WeatherData.objects.filter(
-            city__icontains=city,
-            recorded_at__gte=cutoff_time
-        ).first()
+        # Unknown names stay unregistered until a provider returns data for them
+        weather_data, air_quality_data = cls._recent(city, cutoff_time)
         
-        air_quality_data = AirQualityData.objects.filter(
-            city__icontains=city,
-            recorded_at__gte=cutoff_time
-        ).first()
+        # When the refresh scheduler keeps data warm, views never call providers
+        if not settings.FETCH_ON_READ:
+            return {
+                'weather': weather_data,
+                'air_quality': air_quality_data
+            }
         
-        # If no recent data, fetch new data
+        # If no recent data, fetch new data; concurrent misses for the same
+        # city share a single provider call and a single inserted row
         if not weather_data:
-            weather_data = cls.update_weather_data(city)
+            weather_data = single_flight(
+                make_key('refresh', 'weather', normalize_city(city)),
+                lambda: cls.update_weather_data(city),
+                recheck=lambda: cls._recent(city, cutoff_time, recheck=True)[0],
+                wait_timeout=settings.REFRESH_WAIT_TIMEOUT
+            )
         
         if not air_quality_data:
-            air_quality_data = cls.update_air_quality_data(city)
+            air_quality_data = single_flight(
+                make_key('refresh', 'air_quality', normalize_city(city)),
+                lambda: cls.update_air_quality_data(city),
+                recheck=lambda: cls._recent(city, cutoff_time, recheck=True)[1],
+                wait_timeout=settings.REFRESH_WAIT_TIMEOUT
+            )
         
         return {
             'weather': weather_data,
             'air_quality': air_quality_data
         }
 
+    @classmethod
+    def _recent(cls, city, since, recheck=False):
+        """Latest weather and air quality readings for a city name since ``since``"""
+        city_ref = CityRegistry.lookup(city, recheck=recheck)
+        if city_ref is None:
+            return None, None
+        return cls.get_latest(city_ref, since=since)
+
 class WaterLevelService:
+    UPSERT_FIELDS = [
+        'city', 'water_body_type', 'current_level', 'normal_level', 'warning_level', 'danger_level',
+        'alert_status', 'latitude', 'longitude', 'last_updated',
+    ]
+    
+    @classmethod
+    def upsert(cls, levels, batch_size=500, alert=False):
+        """Insert or update gauge readings (dicts of WaterLevel fields) keyed by location_name.
+
+        Alert statuses for the whole batch are computed in one vectorized pass
+        and rows are written with bulk upserts, so a refresh of thousands of
+        gauges costs a few statements. With ``alert``, gauges that have just
+        become critical alert their city; only pass it for real gauge data, as
+        the ``ingest_water_levels`` command does.
+        Returns the number of gauges written.
+        """
+        # The last reading wins if a gauge appears twice in one batch
+        levels = list({level['location_name']: level for level in levels}.values())
+        if not levels:
+            return 0
+        
+        thresholds = ('current_level', 'normal_level', 'warning_level', 'danger_level')
+        statuses = WaterLevel.alert_statuses(*([level[field] for level in levels] for field in thresholds))
+        gauges = [
+            WaterLevel(**{**level, 'alert_status': status})
+            for level, status in zip(levels, statuses)
+        ]
+        previous = {}
+        if alert:
+            previous = dict(
+                WaterLevel.objects.filter(location_name__in=[gauge.location_name for gauge in gauges])
+                .values_list('location_name', 'alert_status')
+            )
+        
+        with transaction.atomic():
+            WaterLevel.objects.bulk_create(
+                gauges,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['location_name'],
+                update_fields=cls.UPSERT_FIELDS
+            )
+        
+        if alert:
+            cls.alert_critical([
+                gauge for gauge in gauges
+                if gauge.alert_status == 'critical' and previous.get(gauge.location_name) != 'critical'
+            ])
+        return len(gauges)
+    
+    @classmethod
+    def alert_critical(cls, gauges):
+        """Alert each gauge's city that it has just reached a critical level"""
+        by_city = {}
+        for gauge in gauges:
+            by_city.setdefault(gauge.city, []).append(gauge)
+        for city_name, city_gauges in by_city.items():
+            city = CityRegistry.lookup(city_name)
+            if city is None:
+                logger.warning(f"No city registered for {city_name}, skipping {len(city_gauges)} critical level alerts")
+                continue
+            for gauge in city_gauges:
+                message = (
+                    f"{gauge.location_name} has reached a critical level: {gauge.current_level:.2f} m "
+                    f"(danger mark {gauge.danger_level:.2f} m)"
+                )
+                AlertFanout.send(
+                    city.pk,
+                    'water_level',
+                    message,
+                    severity='danger',
+                    dedupe_key=f"water_level:{gauge.location_name}:critical"
+                )
+    
     @classmethod
     def get_mock_water_levels(cls, city):
         """Generate mock water level data for demonstration"""
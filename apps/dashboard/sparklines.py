@@ -0,0 +1,115 @@
+"""Per-worker ring buffers of the last day of observations, for sparkline charts.
+
+Each city and kind gets a fixed-size buffer of NumPy columns. Ingestion in
+this process appends to it directly; other processes' writes are picked up
+by a small incremental query at most every ``SPARKLINE_SYNC_SECONDS``, so
+sparkline requests are normally served without touching the database.
+"""
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AirQualityData, WeatherData
+
+METRICS = {
+    'weather': (WeatherData, ('temperature', 'humidity', 'rainfall')),
+    'air_quality': (AirQualityData, ('aqi', 'pm25', 'pm10')),
+}
+
+
+class RingBuffer:
+    """Fixed number of (timestamp, metrics...) rows; appending past capacity overwrites the oldest"""
+
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.columns = columns
+        self.times = np.zeros(capacity)
+        self.values = np.full((len(columns), capacity), np.nan)
+        self.next = 0
+        self.size = 0
+        self.last_pk = 0
+        self.synced_at = 0.0
+
+    def append(self, pk, timestamp, values):
+        if pk <= self.last_pk:
+            return
+        self.times[self.next] = timestamp
+        self.values[:, self.next] = [np.nan if value is None else value for value in values]
+        self.next = (self.next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.last_pk = pk
+
+    def window(self, since):
+        """Copies of the timestamps and metric rows at or after ``since``, oldest first"""
+        order = (self.next - self.size + np.arange(self.size)) % self.capacity
+        times = self.times[order]
+        keep = times >= since
+        return times[keep], self.values[:, order[keep]]
+
+
+class SparklineStore:
+    _buffers = {}  # (city id, kind) -> RingBuffer
+    _lock = threading.Lock()
+
+    @classmethod
+    def series(cls, city, kind, hours=None):
+        """Timestamps (epoch seconds) and metric lists for the last ``hours`` of a city's readings"""
+        hours = hours or settings.SPARKLINE_HOURS
+        key = (city.pk, kind)
+        buffer = cls._buffers.get(key)
+        if buffer is None or time.monotonic() - buffer.synced_at >= settings.SPARKLINE_SYNC_SECONDS:
+            buffer = cls._sync(city.pk, kind)
+
+        with cls._lock:
+            times, values = buffer.window(time.time() - hours * 3600)
+
+        series = {'timestamps': times.astype(np.int64).tolist()}
+        for column, row in zip(buffer.columns, values):
+            series[column] = [None if np.isnan(value) else value for value in row.tolist()]
+        return series
+
+    @classmethod
+    def add(cls, weather=(), air_quality=()):
+        """Append freshly saved observations to buffers this worker already holds"""
+        with cls._lock:
+            for kind, observations in (('weather', weather), ('air_quality', air_quality)):
+                columns = METRICS[kind][1]
+                for observation in observations:
+                    buffer = cls._buffers.get((observation.city_ref_id, kind))
+                    # Cities nobody has asked for yet are loaded in full on first read
+                    if buffer is not None:
+                        buffer.append(
+                            observation.pk,
+                            observation.recorded_at.timestamp(),
+                            [getattr(observation, column) for column in columns]
+                        )
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._buffers = {}
+
+    @classmethod
+    def _sync(cls, city_id, kind):
+        """Load a city's buffer, or fetch only the rows added since it was last synced"""
+        model, columns = METRICS[kind]
+        since = timezone.now() - timedelta(hours=settings.SPARKLINE_HOURS)
+        buffer = cls._buffers.get((city_id, kind))
+        if buffer is None:
+            buffer = RingBuffer(settings.SPARKLINE_CAPACITY, columns)
+
+        rows = model.objects.filter(city_ref_id=city_id, recorded_at__gte=since, pk__gt=buffer.last_pk)
+        rows = list(
+            rows.order_by('-recorded_at', '-pk').values_list('pk', 'recorded_at', *columns)[:buffer.capacity]
+        )
+
+        with cls._lock:
+            for pk, recorded_at, *values in reversed(rows):
+                buffer.append(pk, recorded_at.timestamp(), values)
+            buffer.synced_at = time.monotonic()
+            cls._buffers[(city_id, kind)] = buffer
+        return buffer
@@ -1,3 +1,813 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import aqi, export, pagination
+from .alerts import AlertFanout, AlertInbox
+from .anomalies import AnomalyDetector
+from .cache import read_through, single_flight
+from .cities import CityRegistry
+from .models import (
+    AirQualityData, City, CityAlias, LatestObservation, MetricBaseline, NotificationDigest, ObservationRollup,
+    UserAlert, WaterLevel, WeatherData,
+)
+from .retention import RetentionService
+from .rollups import WEATHER_METRICS, RollupService
+from .services import DataService, WaterLevelService, WeatherService
+from .ingestion import IngestionService
+from .notifications import NotificationService, Transport
+from .rainfall import RainfallAccumulator, RainfallService
+
+
+class AQITests(SimpleTestCase):
+
+    def test_epa_breakpoints(self):
+        self.assertEqual(aqi.aqi_for({'pm25': 35.4}), 100)
+        self.assertEqual(aqi.aqi_for({'pm25': 12.05}), 51)  # in the gap between 12.0 and 12.1
+        self.assertEqual(aqi.aqi_for({'co': aqi.to_micrograms('co', 9.4, 'ppm')}), 100)
+
+    def test_highest_sub_index_wins(self):
+        values, dominant = aqi.compute({'pm25': [35.4], 'pm10': [10.0]})
+        self.assertEqual(values[0], 100)
+        self.assertEqual(aqi.POLLUTANTS[dominant[0]], 'pm25')
+
+    def test_no_readings(self):
+        self.assertIsNone(aqi.aqi_for({}))
+        values, dominant = aqi.compute({pollutant: [None, float('nan')] for pollutant in aqi.POLLUTANTS})
+        self.assertTrue(all(value != value for value in values))
+        self.assertEqual(dominant.tolist(), [-1, -1])
+
+    def test_unit_conversion(self):
+        self.assertEqual(aqi.to_micrograms('pm25', 0.02, 'mg/m3'), 20.0)
+        self.assertAlmostEqual(aqi.to_micrograms('no2', 100, 'ppb'), 188.18, places=2)
+        self.assertIsNone(aqi.to_micrograms('pm25', 10, 'ppm'))
+
+
+class RecomputeAQICommandTests(TestCase):
+
+    def setUp(self):
+        # The registry outlives each test's transaction
+        CityRegistry.clear()
+        self.stale = AirQualityData.objects.create(city='Chennai', country='IN', aqi=0, pm25=35.4)
+        self.current = AirQualityData.objects.create(city='Chennai', country='IN', aqi=51, pm25=12.05)
+        self.unmeasured = AirQualityData.objects.create(city='Chennai', country='IN', aqi=42)
+
+    def test_dry_run_reports_without_writing(self):
+        out = StringIO()
+        call_command('recompute_aqi', '--dry-run', stdout=out)
+        self.assertIn("3 rows scanned, 1 would change, 1 without pollutant readings", out.getvalue())
+        self.stale.refresh_from_db()
+        self.assertEqual(self.stale.aqi, 0)
+
+    def test_updates_only_changed_rows(self):
+        call_command('recompute_aqi', stdout=StringIO())
+        self.assertEqual(
+            dict(AirQualityData.objects.values_list('pk', 'aqi')),
+            {self.stale.pk: 100, self.current.pk: 51, self.unmeasured.pk: 42}
+        )
+
+
+class RainfallAccumulatorTests(SimpleTestCase):
+    # Readings at HOUR fall in clock hour 1000
+    HOUR = 1000 * 3600 + 1800
+
+    def test_newer_reading_replaces_same_hour(self):
+        accumulator = RainfallAccumulator()
+        accumulator.add(self.HOUR, 2.0)
+        accumulator.add(self.HOUR + 600, 3.0)
+        self.assertEqual(accumulator.totals_at(self.HOUR + 600)[1], 3.0)
+
+    def test_three_hour_reading_keeps_measured_hours(self):
+        accumulator = RainfallAccumulator()
+        accumulator.add(self.HOUR, 3.0)
+        accumulator.add(self.HOUR + 3600, 6.0, window=3)  # 2 mm into hours 999-1001, except 1000
+        totals = accumulator.totals_at(self.HOUR + 3600)
+        self.assertEqual(totals[1], 2.0)
+        self.assertEqual(totals[3], 7.0)
+
+    def test_hours_leave_their_windows(self):
+        accumulator = RainfallAccumulator()
+        accumulator.add(self.HOUR, 3.0)
+        accumulator.add(self.HOUR + 3600, 6.0, window=3)
+        totals = accumulator.totals_at(self.HOUR + 24 * 3600)
+        self.assertEqual(totals, {1: 0.0, 3: 0.0, 24: 2.0, 72: 7.0})
+        self.assertEqual(accumulator.totals_at(self.HOUR + 80 * 3600), {1: 0.0, 3: 0.0, 24: 0.0, 72: 0.0})
+
+
+class RainfallAlertTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        RainfallService.clear()
+        self.city = City.objects.create(name='Chennai', normalized_name='chennai')
+        get_user_model().objects.create_user('resident', city='Chennai')
+
+    def _reading(self, rainfall):
+        return {
+            'city': 'Chennai', 'country': 'IN', 'temperature': 27, 'humidity': 95, 'pressure': 1002,
+            'rainfall': rainfall, 'wind_speed': 6, 'weather_description': 'heavy intensity rain'
+        }
+
+    def test_saving_readings_does_not_alert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DataService.save_observations(weather_records=[{**self._reading(80.0), 'city_ref': self.city}])
+        self.assertEqual(UserAlert.objects.count(), 0)
+
+    def test_ingestion_alerts_once_per_window(self):
+        with mock.patch.object(WeatherService, 'resolve_city', return_value=None), \
+                mock.patch.object(WeatherService, 'get_current_weather', return_value=self._reading(80.0)):
+            IngestionService.ingest(['Chennai'], kinds=['weather'])
+            IngestionService.ingest(['Chennai'], kinds=['weather'])
+
+        alerts = UserAlert.objects.order_by('dedupe_key')
+        self.assertEqual(list(alerts.values_list('dedupe_key', flat=True)), ['rainfall:1h', 'rainfall:3h'])
+        self.assertEqual(alerts[0].severity, 'danger')  # 80 mm is over twice the 1h level
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        self.city = city = City.objects.create(name='Chennai', normalized_name='chennai')
+        self.now = now = timezone.now().replace(microsecond=0)
+        for minutes in (0, 0, 0, 10, 10, 20, 30):
+            reading = WeatherData.objects.create(
+                city='Chennai', city_ref=city, country='IN', temperature=30, humidity=80,
+                pressure=1000, wind_speed=2, weather_description='rain'
+            )
+            # Several readings share a timestamp, so pages must break ties on id
+            WeatherData.objects.filter(pk=reading.pk).update(recorded_at=now - timedelta(minutes=minutes))
+
+    def test_pages_cover_every_row_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = pagination.keyset_page(WeatherData.objects.all(), cursor, page_size=2)
+            seen.extend((row.recorded_at, row.pk) for row in page)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(seen, sorted(set(seen), reverse=True))
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now()
+        self.assertEqual(pagination.decode_cursor(pagination.encode_cursor(moment, 42)), (moment, 42))
+        with self.assertRaises(ValueError):
+            pagination.decode_cursor('not-a-cursor')
+
+    def test_history_api_rejects_bad_cursor(self):
+        self.client.force_login(get_user_model().objects.create_user('reader'))
+        response = self.client.get('/api/weather/history/Chennai/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_history_api_pages_into_archived_months(self):
+        for days in (100, 130, 160):
+            reading = WeatherData.objects.create(
+                city='Chennai', city_ref=self.city, country='IN', temperature=days, humidity=80,
+                pressure=1000, wind_speed=2, weather_description='rain'
+            )
+            WeatherData.objects.filter(pk=reading.pk).update(recorded_at=self.now - timedelta(days=days))
+        self.client.force_login(get_user_model().objects.create_user('reader'))
+
+        with override_settings(OBSERVATION_ARCHIVE_DIR=tempfile.mkdtemp()):
+            RetentionService.archive(older_than=self.now - timedelta(days=90))
+            self.assertEqual(WeatherData.objects.count(), 7)
+
+            temperatures, cursor = [], None
+            while True:
+                params = {'limit': 4, **({'cursor': cursor} if cursor else {})}
+                page = self.client.get('/api/weather/history/Chennai/', params).json()
+                temperatures.extend(item['temperature'] for item in page['history'])
+                cursor = page['next_cursor']
+                if cursor is None:
+                    break
+        self.assertEqual(temperatures, [30.0] * 7 + [100.0, 130.0, 160.0])
+
+
+class CityRegistryTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        self.mumbai = City.objects.create(name='Mumbai', normalized_name='mumbai', openweather_id=1275339)
+        # Created from a URL before the provider had resolved the name
+        self.bombay = City.objects.create(name='Bombay', normalized_name='bombay')
+        self.identity = {
+            'name': 'Mumbai', 'country': 'IN', 'latitude': 19.07, 'longitude': 72.88, 'openweather_id': 1275339
+        }
+
+    def _reading(self, city, rainfall):
+        return WeatherData.objects.create(
+            city=city.name, city_ref=city, country='IN', temperature=30, humidity=80,
+            pressure=1000, rainfall=rainfall, wind_speed=2, weather_description='rain'
+        )
+
+    def test_register_merges_bare_entry_into_resolved_city(self):
+        ours, theirs = self._reading(self.mumbai, 1.0), self._reading(self.bombay, 4.0)
+        RollupService.add(weather=[ours, theirs])
+        LatestObservation.objects.create(city=self.bombay, weather=theirs)
+        resident = get_user_model().objects.create_user('resident', city='Bombay')
+        self.assertEqual(resident.city_ref, self.bombay)
+
+        archive_dir = tempfile.mkdtemp()
+        with override_settings(OBSERVATION_ARCHIVE_DIR=archive_dir), self.captureOnCommitCallbacks(execute=True):
+            archived = self._reading(self.bombay, 2.0)
+            RetentionService._write('weather', self.bombay.pk, timezone.now().replace(day=1), [
+                tuple(getattr(archived, name) for name in RetentionService.KINDS['weather'][1])
+            ])
+            archived.delete()
+            city = CityRegistry.register('Bombay', self.identity)
+
+        self.assertEqual(city, self.mumbai)
+        self.assertFalse(City.objects.filter(pk=self.bombay.pk).exists())
+        self.assertEqual(CityAlias.objects.get(alias='bombay').city, self.mumbai)
+        self.assertEqual(set(WeatherData.objects.values_list('city_ref', flat=True)), {self.mumbai.pk})
+        resident.refresh_from_db()
+        self.assertEqual(resident.city_ref, self.mumbai)
+        self.assertEqual(LatestObservation.objects.get(city=self.mumbai).weather, theirs)
+
+        rollup = ObservationRollup.objects.get(city=self.mumbai, resolution='hour', metric='rainfall')
+        self.assertEqual((rollup.count, rollup.total), (2, 5.0))
+        self.assertFalse(ObservationRollup.objects.filter(city_id=self.bombay.pk).exists())
+
+        with override_settings(OBSERVATION_ARCHIVE_DIR=archive_dir):
+            self.assertEqual([row['rainfall'] for row in RetentionService.archived('weather', self.mumbai)], [2.0])
+
+    def test_every_worker_sees_the_same_city(self):
+        CityRegistry.register('Bombay', self.identity)
+        self.assertEqual(CityRegistry.lookup('Bombay'), self.mumbai)
+        # A fresh worker answers from the database alone
+        CityRegistry.clear()
+        self.assertEqual(CityRegistry.lookup('Bombay'), self.mumbai)
+
+    def test_other_workers_drop_merged_cities(self):
+        self.assertEqual(CityRegistry.lookup('Bombay'), self.bombay)
+        stale_index, stale_generation = dict(CityRegistry._index), CityRegistry._generation
+        CityRegistry.register('Bombay', self.identity)
+
+        # Another worker still holding the deleted entry notices the merge on its next check
+        CityRegistry._index, CityRegistry._generation = stale_index, stale_generation
+        CityRegistry._checked_at = 0.0
+        self.assertEqual(CityRegistry.lookup('Bombay'), self.mumbai)
+
+    def test_resolved_cities_are_never_merged(self):
+        self.bombay.openweather_id = 1
+        self.bombay.save()
+        CityRegistry.register('Bombay', self.identity)
+        self.assertTrue(City.objects.filter(pk=self.bombay.pk).exists())
+        CityRegistry.clear()
+        self.assertEqual(CityRegistry.lookup('Bombay'), self.bombay)
+
+
+class WaterLevelServiceTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        get_user_model().objects.create_user('resident', city='Chennai')
+
+    def _gauge(self, name, current, **fields):
+        return {
+            'location_name': name, 'city': 'Chennai', 'water_body_type': 'river', 'current_level': current,
+            'normal_level': 2.0, 'warning_level': 4.0, 'danger_level': 5.0, 'latitude': 13.0, 'longitude': 80.2,
+            **fields
+        }
+
+    def test_statuses_computed_for_the_batch(self):
+        written = WaterLevelService.upsert([
+            self._gauge('Adyar', 1.0), self._gauge('Cooum', 2.5), self._gauge('Kosasthalaiyar', 4.2),
+            self._gauge('Poondi', 5.0),
+        ])
+        self.assertEqual(written, 4)
+        self.assertEqual(
+            dict(WaterLevel.objects.values_list('location_name', 'alert_status')),
+            {'Adyar': 'normal', 'Cooum': 'warning', 'Kosasthalaiyar': 'danger', 'Poondi': 'critical'}
+        )
+
+    def test_upsert_updates_existing_gauges_and_keeps_last_duplicate(self):
+        WaterLevelService.upsert([self._gauge('Adyar', 1.0)])
+        WaterLevelService.upsert([self._gauge('Adyar', 4.5), self._gauge('Adyar', 4.1)])
+        gauge = WaterLevel.objects.get()
+        self.assertEqual((gauge.current_level, gauge.alert_status), (4.1, 'danger'))
+
+    def test_alerts_only_when_a_gauge_becomes_critical(self):
+        WaterLevelService.upsert([self._gauge('Adyar', 5.5)])
+        self.assertEqual(UserAlert.objects.count(), 0)
+
+        WaterLevelService.upsert([self._gauge('Adyar', 1.0)], alert=True)
+        WaterLevelService.upsert([self._gauge('Adyar', 5.5)], alert=True)
+        WaterLevelService.upsert([self._gauge('Adyar', 5.8)], alert=True)  # still critical
+        alert = UserAlert.objects.get()
+        self.assertEqual((alert.alert_type, alert.severity), ('water_level', 'danger'))
+        self.assertEqual(alert.dedupe_key, 'water_level:Adyar:critical')
+
+    def test_ingest_command_alerts_from_a_file(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump([self._gauge('Adyar', 5.5)], f)
+        self.addCleanup(os.unlink, path)
+
+        out = StringIO()
+        call_command('ingest_water_levels', path, stdout=out)
+        self.assertIn("Updated 1 gauges", out.getvalue())
+        self.assertEqual(UserAlert.objects.filter(alert_type='water_level').count(), 1)
+
+
+class ReadThroughCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.fetch = mock.Mock(return_value=['fresh'])
+
+    def test_fresh_value_is_reused(self):
+        self.assertEqual(read_through('forecast:chennai', self.fetch, fresh_for=60, stale_for=60), ['fresh'])
+        self.assertEqual(read_through('forecast:chennai', self.fetch, fresh_for=60, stale_for=60), ['fresh'])
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_stale_value_served_while_another_worker_refreshes(self):
+        read_through('forecast:chennai', lambda: ['old'], fresh_for=0, stale_for=60)
+        cache.add('forecast:chennai:refresh', True, 30)  # held by another worker
+        self.assertEqual(read_through('forecast:chennai', self.fetch, fresh_for=60, stale_for=60), ['old'])
+        self.fetch.assert_not_called()
+
+    def test_stale_value_kept_when_refresh_fails(self):
+        read_through('forecast:chennai', lambda: ['old'], fresh_for=0, stale_for=60)
+        self.assertEqual(read_through('forecast:chennai', lambda: [], fresh_for=60, stale_for=60), ['old'])
+        self.assertEqual(read_through('forecast:chennai', self.fetch, fresh_for=60, stale_for=60), ['fresh'])
+
+    def test_empty_results_are_not_cached(self):
+        read_through('forecast:nowhere', lambda: [], fresh_for=60, stale_for=60)
+        self.assertIsNone(cache.get('forecast:nowhere'))
+
+    def test_forecast_expires_when_the_next_run_is_published(self):
+        step = 3 * 60 * 60
+        with override_settings(FORECAST_STEP_SECONDS=step, FORECAST_PUBLISH_DELAY_SECONDS=300), \
+                mock.patch('time.time', return_value=100 * step + 360):
+            # A minute after the 300s publish delay, the next run is a whole step away
+            self.assertEqual(WeatherService._seconds_until_next_forecast(), step - 60)
+        with override_settings(FORECAST_STEP_SECONDS=step, FORECAST_PUBLISH_DELAY_SECONDS=300), \
+                mock.patch('time.time', return_value=100 * step + 60):
+            self.assertEqual(WeatherService._seconds_until_next_forecast(), 240)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.stored = {}  # stands in for the table the leader writes to
+        self.fetches = 0
+        self.release = threading.Event()
+
+    def fetch(self):
+        self.fetches += 1
+        self.release.wait(5)
+        self.stored['chennai'] = 'reading'
+        return 'reading'
+
+    def recheck(self):
+        return self.stored.get('chennai')
+
+    def test_concurrent_misses_share_one_fetch(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight('refresh:chennai', self.fetch, self.recheck)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['reading'] * 8)
+        self.assertEqual(self.fetches, 1)
+
+    def test_waits_for_the_worker_holding_the_lock(self):
+        cache.add('refresh:chennai:flight', True, 30)
+        threading.Timer(0.05, self.stored.update, kwargs={'chennai': 'reading'}).start()
+        result = single_flight('refresh:chennai', self.fetch, self.recheck, wait_timeout=2, poll_interval=0.01)
+        self.assertEqual(result, 'reading')
+        self.assertEqual(self.fetches, 0)
+
+    def test_gives_up_after_the_wait_timeout(self):
+        cache.add('refresh:chennai:flight', True, 30)
+        result = single_flight('refresh:chennai', self.fetch, self.recheck, wait_timeout=0.05, poll_interval=0.01)
+        self.assertIsNone(result)
+        self.assertEqual(self.fetches, 0)
+
+
+class RollupServiceTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        self.city = City.objects.create(name='Chennai', normalized_name='chennai')
+        self.hour = RollupService.bucket_start(timezone.now() - timedelta(hours=3), 'hour')
+        self.readings = [
+            self._reading(self.hour + timedelta(minutes=5), temperature=28.0, rainfall=2.0),
+            self._reading(self.hour + timedelta(minutes=40), temperature=31.0, rainfall=6.0),
+            self._reading(self.hour + timedelta(minutes=70), temperature=30.0, rainfall=1.0),
+        ]
+
+    def _reading(self, recorded_at, **values):
+        reading = WeatherData.objects.create(
+            city='Chennai', city_ref=self.city, country='IN', humidity=85, pressure=1004,
+            wind_speed=3, weather_description='rain', **values
+        )
+        WeatherData.objects.filter(pk=reading.pk).update(recorded_at=recorded_at)
+        reading.refresh_from_db()
+        return reading
+
+    def _buckets(self, resolution, metric):
+        return [
+            (row.count, row.minimum, row.maximum, row.total)
+            for row in ObservationRollup.objects.filter(city=self.city, resolution=resolution, metric=metric)
+        ]
+
+    def test_readings_fold_into_hourly_and_daily_buckets(self):
+        RollupService.add(weather=self.readings[:2])
+        RollupService.add(weather=self.readings[2:])
+        self.assertEqual(self._buckets('hour', 'temperature'), [(2, 28.0, 31.0, 59.0), (1, 30.0, 30.0, 30.0)])
+        self.assertEqual(sum(count for count, *_ in self._buckets('day', 'rainfall')), 3)
+
+    def test_series_reports_mean_per_bucket(self):
+        RollupService.add(weather=self.readings)
+        series = RollupService.series(self.city, WEATHER_METRICS, 'hour', since=self.hour)
+        self.assertEqual(len(series), 2)
+        self.assertEqual(series[0]['bucket_start'], self.hour.isoformat())
+        self.assertEqual(series[0]['temperature']['mean'], 29.5)
+        self.assertEqual(series[0]['rainfall']['sum'], 8.0)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        RollupService.add(weather=self.readings)
+        incremental = self._buckets('hour', 'rainfall'), self._buckets('day', 'rainfall')
+        ObservationRollup.objects.update(count=0, total=0.0)
+        self.assertEqual(RollupService.rebuild(city=self.city), 3)
+        self.assertEqual((self._buckets('hour', 'rainfall'), self._buckets('day', 'rainfall')), incremental)
+
+    def test_history_api_reads_rollups(self):
+        RollupService.add(weather=self.readings)
+        self.client.force_login(get_user_model().objects.create_user('reader'))
+        response = self.client.get('/api/weather/history/Chennai/', {'resolution': 'hour', 'days': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([bucket['temperature']['count'] for bucket in response.json()['history']], [2, 1])
+        self.assertEqual(
+            self.client.get('/api/weather/history/Chennai/', {'resolution': 'week'}).status_code, 400
+        )
+
+
+class RetentionArchiveTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        self.enterContext(override_settings(OBSERVATION_ARCHIVE_DIR=archive_dir))
+        self.city = City.objects.create(name='Chennai', normalized_name='chennai')
+        self.now = timezone.now()
+
+    def _air_quality(self, days_ago, **values):
+        reading = AirQualityData.objects.create(city='Chennai', city_ref=self.city, country='IN', **values)
+        AirQualityData.objects.filter(pk=reading.pk).update(recorded_at=self.now - timedelta(days=days_ago))
+        return AirQualityData.objects.values(*RetentionService.KINDS['air_quality'][1]).get(pk=reading.pk)
+
+    def test_archive_round_trip(self):
+        old = [self._air_quality(120, aqi=151, pm25=55.5), self._air_quality(100, aqi=42, pm10=40.0, co=600.0)]
+        recent = self._air_quality(1, aqi=60, pm25=15.0)
+
+        counts = RetentionService.archive(older_than=self.now - timedelta(days=90))
+        self.assertEqual(counts, {'weather': 0, 'air_quality': 2})
+        self.assertEqual(list(AirQualityData.objects.values_list('pk', flat=True)), [recent['id']])
+        # Missing pollutants come back as None, datetimes as aware UTC
+        self.assertEqual(list(RetentionService.archived('air_quality', self.city)), old)
+
+    def test_rearchiving_a_month_merges_without_duplicates(self):
+        first = self._air_quality(100, aqi=42, pm25=10.0)
+        RetentionService.archive(older_than=self.now - timedelta(days=90))
+        second = self._air_quality(100, aqi=43, pm25=10.5)
+        RetentionService._write('air_quality', self.city.pk, first['recorded_at'], [
+            tuple(first.values()), tuple(second.values())
+        ])
+        archived = list(RetentionService.archived('air_quality', self.city))
+        self.assertEqual([row['id'] for row in archived], [first['id'], second['id']])
+
+    def test_dry_run_keeps_live_rows(self):
+        self._air_quality(120, aqi=151, pm25=55.5)
+        counts = RetentionService.archive(older_than=self.now - timedelta(days=90), dry_run=True)
+        self.assertEqual(counts['air_quality'], 1)
+        self.assertEqual(AirQualityData.objects.count(), 1)
+        self.assertEqual(list(RetentionService.archived('air_quality', self.city)), [])
+
+    def test_export_streams_archived_then_live_rows(self):
+        self._air_quality(120, aqi=151, pm25=55.5)
+        self._air_quality(1, aqi=60, pm25=15.0)
+        RetentionService.archive(older_than=self.now - timedelta(days=90))
+        rows = list(export.observation_rows('air_quality', city=self.city))
+        self.assertEqual([row['aqi'] for row in rows], [151, 60])
+
+
+@override_settings(ANOMALY_DETECTION={
+    'alpha': 0.1, 'z_threshold': 3.0, 'min_samples': 6, 'cooldown_seconds': 3600,
+    'floors': {'rainfall': 5.0, 'pressure_drop': 2.0, 'wind_speed': 10.0, 'aqi': 100},
+    'min_spread': {'rainfall': 1.0, 'pressure_drop': 0.5, 'wind_speed': 1.0, 'aqi': 5},
+})
+class AnomalyDetectorTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        self.city = City.objects.create(name='Chennai', normalized_name='chennai')
+        get_user_model().objects.create_user('resident', city='Chennai')
+
+    def _observe(self, rainfall, pressure=1008.0):
+        reading = WeatherData.objects.create(
+            city='Chennai', city_ref=self.city, country='IN', temperature=29, humidity=80,
+            pressure=pressure, rainfall=rainfall, wind_speed=3, weather_description='rain'
+        )
+        return AnomalyDetector.observe(weather=[reading])
+
+    def test_ewma_mean_and_variance(self):
+        baseline = MetricBaseline(metric='rainfall')
+        mean, variance = 0.0, 0.0
+        for number, value in enumerate([2.0, 4.0, 3.0, 10.0]):
+            AnomalyDetector._update(baseline, value, alpha=0.1)
+            if number == 0:
+                mean = value
+            else:
+                difference = value - mean
+                mean += 0.1 * difference
+                variance = 0.9 * (variance + 0.1 * difference ** 2)
+        self.assertAlmostEqual(baseline.mean, mean)
+        self.assertAlmostEqual(baseline.variance, variance)
+        self.assertEqual(baseline.count, 4)
+
+    def test_spike_alerts_once_per_cooldown(self):
+        for rainfall in (1.0, 1.5, 0.5, 1.0, 2.0, 1.0):
+            self.assertEqual(self._observe(rainfall), 0)
+        self.assertEqual(self._observe(40.0), 1)
+        self.assertEqual(self._observe(45.0), 0)
+
+        alert = UserAlert.objects.get()
+        self.assertEqual((alert.alert_type, alert.severity), ('weather', 'danger'))
+        self.assertIn('Unusual rainfall in Chennai: 40.0 mm', alert.message)
+
+    def test_no_alerts_before_enough_samples(self):
+        self._observe(1.0)
+        self.assertEqual(self._observe(40.0), 0)
+
+    def test_values_under_the_floor_never_alert(self):
+        for _ in range(6):
+            self._observe(0.0)
+        self.assertEqual(self._observe(4.0), 0)  # far above the mean, but below the 5 mm floor
+
+    def test_pressure_drop_is_measured_between_readings(self):
+        self._observe(0.0, pressure=1010.0)
+        self._observe(0.0, pressure=1007.5)
+        baseline = MetricBaseline.objects.get(city=self.city, metric='pressure_drop')
+        self.assertEqual((baseline.count, baseline.mean, baseline.last_value), (1, 2.5, 1007.5))
+
+
+class AlertFanoutTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        User = get_user_model()
+        self.residents = [User.objects.create_user(f'resident{n}', city='Chennai') for n in range(5)]
+        self.city = self.residents[0].city_ref
+        User.objects.create_user('muted', city='Chennai', notifications_enabled=False)
+        User.objects.create_user('inactive', city='Chennai', is_active=False)
+        User.objects.create_user('elsewhere', city='Mumbai')
+
+    @override_settings(ALERT_FANOUT={'batch_size': 2, 'cooldown_seconds': 3600})
+    def test_alerts_every_resident_who_wants_notifications(self):
+        report = AlertFanout.send(self.city.pk, 'water_level', "Adyar is critical", severity='danger')
+        self.assertEqual(report['created'], 5)
+        self.assertEqual(
+            set(UserAlert.objects.values_list('user__username', flat=True)),
+            {resident.username for resident in self.residents}
+        )
+
+    def test_dedupe_key_skips_residents_alerted_within_the_cooldown(self):
+        AlertFanout.send(self.city.pk, 'weather', "Heavy rain", dedupe_key='rainfall:3h')
+        late = get_user_model().objects.create_user('newcomer', city='Chennai')
+        report = AlertFanout.send(self.city.pk, 'weather', "Heavy rain", dedupe_key='rainfall:3h')
+        self.assertEqual(report['created'], 1)
+        self.assertTrue(UserAlert.objects.filter(user=late).exists())
+
+        UserAlert.objects.update(created_at=timezone.now() - timedelta(days=1))
+        report = AlertFanout.send(self.city.pk, 'weather', "Heavy rain", dedupe_key='rainfall:3h')
+        self.assertEqual(report['created'], 6)
+        self.assertEqual(AlertFanout.send(self.city.pk, 'weather', "Heavy rain", cooldown=0)['created'], 6)
+
+    def test_send_city_alert_command(self):
+        out = StringIO()
+        call_command('send_city_alert', 'chennai', "Flood warning", '--severity', 'danger', stdout=out)
+        self.assertIn("Sent 5 alerts", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('send_city_alert', 'Atlantis', "Flood warning", stdout=StringIO())
+
+
+class UnreadAlertCounterTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        self.user = get_user_model().objects.create_user('resident', city='Chennai')
+        AlertFanout.send(self.user.city_ref_id, 'weather', "Heavy rain")
+        AlertFanout.send(self.user.city_ref_id, 'air_quality', "Poor air")
+        self.user.refresh_from_db()
+
+    def test_fan_out_counts_new_alerts(self):
+        self.assertEqual(self.user.unread_alert_count, 2)
+
+    def test_mark_alert_read_view_updates_the_counter(self):
+        alert = UserAlert.objects.filter(user=self.user).first()
+        self.client.force_login(self.user)
+        url = f'/dashboard/alert/{alert.pk}/mark-read/'
+        self.assertEqual(self.client.post(url).json(), {'success': True, 'unread_count': 1})
+        # Marking it again doesn't count it twice
+        self.assertEqual(self.client.post(url).json()['unread_count'], 1)
+
+    def test_counter_never_goes_negative(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(unread_alert_count=0)
+        self.assertEqual(AlertInbox.mark_read(self.user), 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_alert_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(unread_alert_count=7)
+        self.assertEqual(AlertInbox.reconcile(dry_run=True), 1)
+        out = StringIO()
+        call_command('reconcile_alert_counts', stdout=out)
+        self.assertIn("for 1 users", out.getvalue())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_alert_count, 2)
+        self.assertEqual(AlertInbox.reconcile(), 0)
+
+
+class AlertInboxAPITests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        self.user = get_user_model().objects.create_user('resident', city='Chennai')
+        now = timezone.now()
+        for minutes, (alert_type, severity) in enumerate([
+            ('weather', 'warning'), ('water_level', 'danger'), ('air_quality', 'info'),
+            ('weather', 'danger'), ('weather', 'warning'),
+        ]):
+            alert = UserAlert.objects.create(user=self.user, alert_type=alert_type, message='m', severity=severity)
+            UserAlert.objects.filter(pk=alert.pk).update(created_at=now - timedelta(minutes=minutes))
+        get_user_model().objects.filter(pk=self.user.pk).update(unread_alert_count=5)
+        UserAlert.objects.create(user=get_user_model().objects.create_user('neighbour'), alert_type='weather', message='m')
+        self.client.force_login(self.user)
+
+    def _acknowledge(self, body):
+        return self.client.post('/api/alerts/acknowledge/', json.dumps(body), content_type='application/json')
+
+    def test_inbox_filters_and_pages(self):
+        page = self.client.get('/api/alerts/', {'type': 'weather', 'limit': 2}).json()
+        self.assertEqual([alert['severity'] for alert in page['alerts']], ['warning', 'danger'])
+        rest = self.client.get('/api/alerts/', {'type': 'weather', 'cursor': page['next_cursor']}).json()
+        self.assertEqual([alert['severity'] for alert in rest['alerts']], ['warning'])
+        self.assertIsNone(rest['next_cursor'])
+        self.assertEqual(self.client.get('/api/alerts/', {'severity': 'extreme'}).status_code, 400)
+
+    def test_acknowledge_by_ids(self):
+        ids = list(UserAlert.objects.filter(user=self.user, severity='danger').values_list('pk', flat=True))
+        other = UserAlert.objects.exclude(user=self.user).get().pk
+        response = self._acknowledge({'ids': ids + [other]})
+        self.assertEqual(response.json(), {'marked': 2, 'unread_count': 3})
+        self.assertFalse(UserAlert.objects.get(pk=other).is_read)
+
+    def test_acknowledge_up_to_a_cursor_in_one_update(self):
+        alerts = self.client.get('/api/alerts/').json()['alerts']
+        with CaptureQueriesContext(connection) as queries:
+            response = self._acknowledge({'up_to': alerts[1]['cursor']})
+        alert_updates = [q for q in queries if q['sql'].startswith('UPDATE "dashboard_useralert"')]
+        self.assertEqual(len(alert_updates), 1)
+        self.assertEqual(response.json(), {'marked': 4, 'unread_count': 1})
+        self.assertEqual(
+            list(UserAlert.objects.filter(user=self.user, is_read=False).values_list('pk', flat=True)),
+            [alerts[0]['id']]
+        )
+
+    def test_acknowledge_rejects_bad_requests(self):
+        self.assertEqual(self.client.get('/api/alerts/acknowledge/').status_code, 405)
+        self.assertEqual(self._acknowledge({}).status_code, 400)
+        self.assertEqual(self._acknowledge({'ids': [1], 'up_to': 'x'}).status_code, 400)
+        self.assertEqual(self._acknowledge({'ids': ['1']}).status_code, 400)
+        self.assertEqual(self._acknowledge({'ids': list(range(pagination.MAX_PAGE_SIZE + 1))}).status_code, 400)
+        self.assertEqual(self._acknowledge({'up_to': 'not-a-cursor'}).status_code, 400)
+
+
+class BrokenTransport(Transport):
+    recipient_field = 'email'
+    batches = []
+
+    def send_batch(self, digests):
+        self.batches.append([digest.pk for digest in digests])
+        raise ConnectionError("gateway unreachable")
+
+
+@override_settings(NOTIFICATION_DIGEST={'window_seconds': 300, 'max_attempts': 3, 'retry_seconds': 60})
+class NotificationDigestTests(TestCase):
+
+    def setUp(self):
+        CityRegistry.clear()
+        outbox_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outbox_dir)
+        self.sms_path = os.path.join(outbox_dir, 'sms.ndjson')
+        self._use_transports({
+            'email': {'BACKEND': 'apps.dashboard.notifications.EmailTransport'},
+            'sms': {
+                'BACKEND': 'apps.dashboard.notifications.FileTransport',
+                'recipient_field': 'phone_number',
+                'path': self.sms_path,
+            },
+        })
+        self.now = timezone.now()
+        User = get_user_model()
+        self.asha = User.objects.create_user('asha', email='asha@example.com', phone_number='+919800000001')
+        self.ravi = User.objects.create_user('ravi', email='ravi@example.com')
+
+    def _use_transports(self, transports):
+        self.enterContext(override_settings(NOTIFICATION_TRANSPORTS=transports))
+        NotificationService._transports = None
+        self.addCleanup(setattr, NotificationService, '_transports', None)
+
+    def _alert(self, user, minutes_ago, severity='warning'):
+        alert = UserAlert.objects.create(user=user, alert_type='weather', message='Heavy rain', severity=severity)
+        UserAlert.objects.filter(pk=alert.pk).update(created_at=self.now - timedelta(minutes=minutes_ago))
+        return alert
+
+    def test_collect_coalesces_alerts_once_the_window_has_passed(self):
+        self._alert(self.asha, 10)
+        self._alert(self.asha, 1, severity='danger')
+        waiting = self._alert(self.ravi, 1)
+        muted = get_user_model().objects.create_user('meena', email='meena@example.com', notifications_enabled=False)
+        muted_alert = self._alert(muted, 10)
+
+        self.assertEqual(NotificationService.collect(now=self.now), 2)
+        digests = {digest.transport: digest for digest in NotificationDigest.objects.filter(user=self.asha)}
+        self.assertEqual(digests['email'].recipient, 'asha@example.com')
+        self.assertEqual(digests['sms'].recipient, '+919800000001')
+        self.assertEqual(digests['email'].alert_count, 2)
+        self.assertEqual(digests['email'].subject, "Monsoon Tracker: 2 new alerts (urgent)")
+        self.assertTrue(digests['email'].body.startswith('[DANGER]'))
+
+        # Ravi's only alert is still inside the window; the opted-out user's is settled without a digest
+        self.assertFalse(NotificationDigest.objects.filter(user__in=[self.ravi, muted]).exists())
+        self.assertIsNone(UserAlert.objects.get(pk=waiting.pk).notified_at)
+        self.assertIsNotNone(UserAlert.objects.get(pk=muted_alert.pk).notified_at)
+        self.assertEqual(NotificationService.collect(now=self.now), 0)
+
+    def test_deliver_sends_each_digest_once(self):
+        self._alert(self.asha, 10)
+        self._alert(self.ravi, 10)
+        NotificationService.collect(now=self.now)
+
+        totals = NotificationService.deliver(now=self.now)
+        self.assertEqual(totals, {'sent': 3, 'failed': 0, 'retrying': 0})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['asha@example.com', 'ravi@example.com'])
+        with open(self.sms_path, encoding='utf-8') as outbox:
+            sms = [json.loads(line) for line in outbox]
+        self.assertEqual([message['to'] for message in sms], ['+919800000001'])
+        self.assertFalse(NotificationDigest.objects.exclude(status='sent', sent_at=self.now).exists())
+
+        self.assertEqual(NotificationService.deliver(now=self.now), {'sent': 0, 'failed': 0, 'retrying': 0})
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_sends_back_off_then_give_up(self):
+        self._use_transports({'broken': {'BACKEND': 'apps.dashboard.tests.BrokenTransport', 'batch_size': 1}})
+        self.enterContext(mock.patch.object(BrokenTransport, 'batches', []))
+        logs = self.enterContext(self.assertLogs('apps.dashboard.notifications', 'WARNING'))
+        self._alert(self.asha, 10)
+        self._alert(self.ravi, 10)
+        NotificationService.collect(now=self.now)
+
+        # Each digest is claimed once per call, even though every send fails
+        self.assertEqual(NotificationService.deliver(now=self.now), {'sent': 0, 'failed': 0, 'retrying': 2})
+        self.assertEqual(len(BrokenTransport.batches), 2)
+        self.assertEqual(NotificationService.deliver(now=self.now + timedelta(seconds=59))['retrying'], 0)
+
+        retry_at = self.now + timedelta(seconds=60)
+        self.assertEqual(NotificationService.deliver(now=retry_at)['retrying'], 2)
+        digest = NotificationDigest.objects.get(user=self.asha)
+        self.assertEqual(digest.attempts, 2)
+        self.assertEqual(digest.next_attempt_at, retry_at + timedelta(seconds=120))
+        self.assertEqual(digest.last_error, "gateway unreachable")
+
+        totals = NotificationService.deliver(now=retry_at + timedelta(seconds=120))
+        self.assertEqual(totals, {'sent': 0, 'failed': 2, 'retrying': 0})
+        self.assertEqual(set(NotificationDigest.objects.values_list('status', 'attempts')), {('failed', 3)})
+        self.assertIn("Giving up on broken digest", logs.output[-1])
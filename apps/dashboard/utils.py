@@ -0,0 +1,3 @@
+def normalize_city(city):
+    """Canonical form of a free-text city name, used for lookups and cache keys"""
+    return ' '.join((city or '').split()).casefold()
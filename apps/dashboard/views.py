@@ -1,14 +1,29 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
+from django.utils import timezone
 from datetime import datetime, timedelta
+import asyncio
 import json
 
+from asgiref.sync import sync_to_async
+
 from .models import WeatherData, AirQualityData, WaterLevel, EcoTip, UserAlert
+from . import export, pagination
+from .alerts import AlertInbox
+from .broadcast import Broadcaster, city_channel, user_channel
+from .cities import CityRegistry
+from .rainfall import RainfallService
+from .retention import RetentionService
+from .rollups import AIR_QUALITY_METRICS, WEATHER_METRICS, RollupService
 from .services import DataService, WaterLevelService, WeatherService
+from .sparklines import SparklineStore
 from apps.community.models import CommunityReport
+from monsoon_tracker.db import use_read_replica
 
 def home(request):
     """Home page with basic information"""
@@ -34,19 +49,20 @@ def dashboard(request):
     water_levels = WaterLevelService.get_mock_water_levels(user_city)
     
     # Get recent community reports
-    recent_reports = CommunityReport.objects.filter(
-        city__icontains=user_city,
+    recent_reports = CityRegistry.filter(CommunityReport.objects.all(), user_city).filter(
         created_at__gte=datetime.now() - timedelta(days=7)
     )[:5]
     
     # Get eco tips
     eco_tips = EcoTip.objects.filter(is_active=True).order_by('?')[:4]
     
-    # Get user alerts
-    user_alerts = UserAlert.objects.filter(
-        user=request.user,
-        is_read=False
-    )[:5]
+    # Get user alerts (the unread counter spares the query when there are none)
+    user_alerts = []
+    if request.user.unread_alert_count:
+        user_alerts = UserAlert.objects.filter(
+            user=request.user,
+            is_read=False
+        )[:5]
     
     # Weather forecast
     forecast = WeatherService.get_forecast(user_city, days=3)
@@ -70,8 +86,8 @@ def weather_details(request):
     user_city = request.user.city or 'Chennai'
     
     # Get recent weather data
-    weather_history = WeatherData.objects.filter(
-        city__icontains=user_city
+    weather_history = CityRegistry.filter(
+        WeatherData.objects.all(), user_city
     ).order_by('-recorded_at')[:24]  # Last 24 entries
     
     # Get forecast
@@ -79,7 +95,7 @@ def weather_details(request):
     
     # Get current weather
     current_weather = weather_history.first()
-    if not current_weather:
+    if not current_weather and settings.FETCH_ON_READ:
         current_weather = DataService.update_weather_data(user_city)
     
     context = {
@@ -97,13 +113,13 @@ def air_quality_details(request):
     user_city = request.user.city or 'Chennai'
     
     # Get recent air quality data
-    air_quality_history = AirQualityData.objects.filter(
-        city__icontains=user_city
+    air_quality_history = CityRegistry.filter(
+        AirQualityData.objects.all(), user_city
     ).order_by('-recorded_at')[:24]
     
     # Get current air quality
     current_air_quality = air_quality_history.first()
-    if not current_air_quality:
+    if not current_air_quality and settings.FETCH_ON_READ:
         current_air_quality = DataService.update_air_quality_data(user_city)
     
     context = {
@@ -127,20 +143,9 @@ def water_levels(request):
     """Water level monitoring page"""
     user_city = request.user.city or 'Chennai'
     
-    # Get or create mock water level data
-    water_levels = WaterLevelService.get_mock_water_levels(user_city)
-    
-    # Create or update WaterLevel objects
-    for level_data in water_levels:
-        water_level, created = WaterLevel.objects.get_or_create(
-            location_name=level_data['location_name'],
-            defaults=level_data
-        )
-        if not created:
-            # Update existing record
-            for key, value in level_data.items():
-                setattr(water_level, key, value)
-            water_level.update_alert_status()
+    # Get mock water level data and save it in one bulk upsert; made-up
+    # levels must never alert residents
+    WaterLevelService.upsert(WaterLevelService.get_mock_water_levels(user_city), alert=False)
     
     # Get all water levels for the city
     city_water_levels = WaterLevel.objects.filter(city=user_city)
@@ -181,9 +186,9 @@ def mark_alert_read(request, alert_id):
     if request.method == 'POST':
         try:
             alert = get_object_or_404(UserAlert, id=alert_id, user=request.user)
-            alert.is_read = True
-            alert.save()
-            return JsonResponse({'success': True})
+            AlertInbox.mark_read(request.user, [alert.pk])
+            request.user.refresh_from_db(fields=['unread_alert_count'])
+            return JsonResponse({'success': True, 'unread_count': request.user.unread_alert_count})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
@@ -200,9 +205,14 @@ def get_dashboard_data(request):
     response_data = {
         'weather': None,
         'air_quality': None,
+        'rainfall_totals': None,
         'timestamp': datetime.now().isoformat()
     }
     
+    city_ref = request.user.city_ref or CityRegistry.lookup(user_city)
+    if city_ref is not None:
+        response_data['rainfall_totals'] = RainfallService.totals(city_ref)
+    
     if data['weather']:
         response_data['weather'] = {
             'temperature': data['weather'].temperature,
@@ -221,6 +231,52 @@ def get_dashboard_data(request):
     
     return JsonResponse(response_data)
 
+async def dashboard_stream(request):
+    """Server-Sent Events stream of live readings for the user's city and their own alerts"""
+    if not isinstance(request, ASGIRequest):
+        # A sync worker would be tied up for the life of the stream; 204 tells
+        # EventSource not to reconnect, leaving the page on its regular polling
+        return HttpResponse(status=204)
+    
+    channels = await sync_to_async(_stream_channels)(request)
+    if channels is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    response = StreamingHttpResponse(_event_stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _stream_channels(request):
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    channels = [user_channel(user.pk)]
+    city_ref = user.city_ref or CityRegistry.lookup(user.city or 'Chennai')
+    if city_ref is not None:
+        channels.append(city_channel(city_ref.pk))
+    return channels
+
+async def _event_stream(channels):
+    queue = Broadcaster.subscribe(channels)
+    loop = asyncio.get_running_loop()
+    # Streams are recycled periodically (EventSource reconnects by itself) so a
+    # client that vanished without the server noticing can't hold one forever
+    closes_at = loop.time() + settings.SSE_STREAM_SECONDS
+    try:
+        yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+        while (remaining := closes_at - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(), timeout=min(settings.SSE_KEEPALIVE_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {message}\n\n"
+    finally:
+        Broadcaster.unsubscribe(channels, queue)
+
 # Additional API endpoints
 
 @login_required
@@ -285,24 +341,231 @@ def get_air_quality_data(request, city):
     return JsonResponse({'error': 'Air quality data not available'}, status=404)
 
 @login_required
+@use_read_replica
+def get_weather_history(request, city):
+    """API endpoint for weather history, newest first
+    
+    Accepts ``from``/``to`` (ISO dates or datetimes), ``limit`` and the
+    ``cursor`` returned as ``next_cursor`` to page further back in time.
+    ``?resolution=hour|day`` returns rollup buckets instead of raw readings.
+    """
+    return _history_response(request, city, 'weather', WEATHER_METRICS, lambda item: {
+        'temperature': item.temperature,
+        'humidity': item.humidity,
+        'pressure': item.pressure,
+        'rainfall': item.rainfall,
+        'wind_speed': item.wind_speed,
+        'description': item.weather_description,
+        'recorded_at': item.recorded_at.isoformat()
+    })
+
+@login_required
+@use_read_replica
 def get_air_quality_history(request, city):
-    """API endpoint for air quality history"""
-    history = AirQualityData.objects.filter(
-        city__icontains=city
-    ).order_by('-recorded_at')[:24]
+    """API endpoint for air quality history, newest first
+    
+    Accepts ``from``/``to`` (ISO dates or datetimes), ``limit`` and the
+    ``cursor`` returned as ``next_cursor`` to page further back in time.
+    ``?resolution=hour|day`` returns rollup buckets instead of raw readings.
+    """
+    return _history_response(request, city, 'air_quality', AIR_QUALITY_METRICS, lambda item: {
+        'aqi': item.aqi,
+        'category': item.aqi_category,
+        'pm25': item.pm25,
+        'pm10': item.pm10,
+        'o3': item.o3,
+        'no2': item.no2,
+        'so2': item.so2,
+        'co': item.co,
+        'recorded_at': item.recorded_at.isoformat()
+    })
+
+def _history_response(request, city, kind, metrics, serialize):
+    resolution = request.GET.get('resolution', 'raw')
+    if resolution != 'raw' and resolution not in RollupService.RESOLUTIONS:
+        return JsonResponse({'error': 'resolution must be raw, hour or day'}, status=400)
+    try:
+        since = export.parse_moment(request.GET.get('from'))
+        until = export.parse_moment(request.GET.get('to'))
+        page_size = pagination.parse_page_size(request.GET.get('limit'))
+        if resolution != 'raw' and since is None:
+            days = int(request.GET.get('days', 90 if resolution == 'day' else 7))
+            since = timezone.now() - timedelta(days=days)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    city_ref = CityRegistry.lookup(city)
+    
+    if resolution != 'raw':
+        history_data = []
+        if city_ref is not None:
+            history_data = RollupService.series(city_ref, metrics, resolution, since=since, until=until)
+        return JsonResponse({'resolution': resolution, 'history': history_data})
+    
+    model = RetentionService.KINDS[kind][0]
+    history = model.objects.filter(city_ref=city_ref) if city_ref else model.objects.none()
+    if since is not None:
+        history = history.filter(recorded_at__gte=since)
+    if until is not None:
+        history = history.filter(recorded_at__lt=until)
+    
+    cursor = request.GET.get('cursor')
+    try:
+        page, next_cursor = pagination.keyset_page(history, cursor, page_size)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # Once the live rows run out, carry on into the monthly archives; they
+    # are all older than the live rows, so the same cursor keeps working
+    if next_cursor is None and city_ref is not None:
+        if page:
+            before = (page[-1].recorded_at, page[-1].pk)
+        else:
+            before = pagination.decode_cursor(cursor) if cursor else None
+        wanted = page_size - len(page)
+        archived = RetentionService.archived_page(
+            kind, city_ref, since=since, until=until, before=before, limit=wanted + 1
+        )
+        if len(archived) > wanted:
+            archived = archived[:wanted]
+            next_cursor = pagination.encode_cursor(archived[-1]['recorded_at'], archived[-1]['id'])
+        page += [model(**row) for row in archived]
+    
+    return JsonResponse({
+        'history': [serialize(item) for item in page],
+        'next_cursor': next_cursor
+    })
+
+@login_required
+def get_alerts(request):
+    """API endpoint for the user's alert inbox, newest first"""
+    alerts = UserAlert.objects.filter(user=request.user)
+    for param, field, choices in (
+        ('severity', 'severity', UserAlert._meta.get_field('severity').choices),
+        ('type', 'alert_type', UserAlert._meta.get_field('alert_type').choices),
+    ):
+        values = request.GET.getlist(param)
+        allowed = {value for value, _ in choices}
+        if set(values) - allowed:
+            return JsonResponse({'error': f"{param} must be one of {', '.join(sorted(allowed))}"}, status=400)
+        if values:
+            alerts = alerts.filter(**{f'{field}__in': values})
+    if request.GET.get('unread') in ('1', 'true'):
+        alerts = alerts.filter(is_read=False)
+    
+    try:
+        page_size = pagination.parse_page_size(request.GET.get('limit'))
+        page, next_cursor = pagination.keyset_page(alerts, request.GET.get('cursor'), page_size, field='created_at')
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'alerts': [
+            {
+                'id': alert.id,
+                'alert_type': alert.alert_type,
+                'message': alert.message,
+                'severity': alert.severity,
+                'is_read': alert.is_read,
+                'created_at': alert.created_at.isoformat(),
+                # Pass to the acknowledge API as up_to to mark this alert and all older ones read
+                'cursor': pagination.encode_cursor(alert.created_at, alert.id),
+            }
+            for alert in page
+        ],
+        'next_cursor': next_cursor,
+        'unread_count': request.user.unread_alert_count,
+    })
+
+@login_required
+def acknowledge_alerts(request):
+    """API endpoint marking alerts read, given {"ids": [...]} or {"up_to": <cursor>}"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    alert_ids = data.get('ids')
+    up_to = data.get('up_to')
+    if (alert_ids is None) == (up_to is None):
+        return JsonResponse({'error': 'Provide either ids or up_to'}, status=400)
+    if alert_ids is not None and (
+        not isinstance(alert_ids, list)
+        or len(alert_ids) > pagination.MAX_PAGE_SIZE
+        or not all(isinstance(alert_id, int) for alert_id in alert_ids)
+    ):
+        return JsonResponse(
+            {'error': f"ids must be a list of at most {pagination.MAX_PAGE_SIZE} alert ids"}, status=400
+        )
     
-    history_data = []
-    for item in history:
-        history_data.append({
-            'aqi': item.aqi,
-            'category': item.aqi_category,
-            'pm25': item.pm25,
-            'recorded_at': item.recorded_at.isoformat()
-        })
+    try:
+        marked = AlertInbox.mark_read(request.user, alert_ids=alert_ids, up_to=up_to)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    return JsonResponse({'history': history_data})
+    request.user.refresh_from_db(fields=['unread_alert_count'])
+    return JsonResponse({'marked': marked, 'unread_count': request.user.unread_alert_count})
+
+@login_required
+def get_weather_sparkline(request, city):
+    """API endpoint for the last day of weather readings as compact columns"""
+    return _sparkline_response(request, city, 'weather')
+
+@login_required
+def get_air_quality_sparkline(request, city):
+    """API endpoint for the last day of air quality readings as compact columns"""
+    return _sparkline_response(request, city, 'air_quality')
+
+def _sparkline_response(request, city, kind):
+    try:
+        hours = int(request.GET.get('hours', settings.SPARKLINE_HOURS))
+    except ValueError:
+        return JsonResponse({'error': 'hours must be an integer'}, status=400)
+    if not 1 <= hours <= settings.SPARKLINE_HOURS:
+        return JsonResponse({'error': f'hours must be between 1 and {settings.SPARKLINE_HOURS}'}, status=400)
+    
+    city_ref = CityRegistry.lookup(city)
+    if city_ref is None:
+        return JsonResponse({'error': 'Unknown city'}, status=404)
+    
+    return JsonResponse({'city': city_ref.name, **SparklineStore.series(city_ref, kind, hours)})
+
+@login_required
+@use_read_replica
+def export_weather_history(request, city):
+    """Stream a city's weather history as NDJSON or CSV (?format=ndjson|csv&from=&to=)"""
+    return _stream_export(request, 'weather', city)
+
+@login_required
+@use_read_replica
+def export_air_quality_history(request, city):
+    """Stream a city's air quality history as NDJSON or CSV (?format=ndjson|csv&from=&to=)"""
+    return _stream_export(request, 'air_quality', city)
+
+def _stream_export(request, kind, city):
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        return JsonResponse({'error': 'format must be ndjson or csv'}, status=400)
+    try:
+        since = export.parse_moment(request.GET.get('from'))
+        until = export.parse_moment(request.GET.get('to'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    city_ref = CityRegistry.lookup(city)
+    if city_ref is None:
+        return JsonResponse({'error': 'Unknown city'}, status=404)
+    
+    columns = list(RetentionService.KINDS[kind][1])
+    rows = export.observation_rows(kind, city=city_ref, since=since, until=until)
+    response = StreamingHttpResponse(export.encode(rows, fmt, columns), content_type=export.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{city_ref.normalized_name.replace(" ", "-")}.{fmt}"'
+    return response
 
 @login_required
+@use_read_replica
 def get_water_levels(request):
     """API endpoint for all water levels"""
     water_levels = WaterLevel.objects.all()
@@ -328,6 +591,7 @@ def get_water_levels(request):
     return JsonResponse(levels_data, safe=False)
 
 @login_required
+@use_read_replica
 def get_city_water_levels(request, city):
     """API endpoint for city-specific water levels"""
     water_levels = WaterLevel.objects.filter(city__icontains=city)
@@ -407,6 +671,7 @@ def check_email_availability(request):
     return JsonResponse({'available': False, 'error': 'Invalid request'})
 
 @login_required
+@use_read_replica
 def get_community_reports_map(request):
     """API endpoint for community reports map data"""
     from apps.community.models import CommunityReport
@@ -0,0 +1,72 @@
+"""Database connection tuning and read-replica routing"""
+import contextvars
+from functools import wraps
+
+from django.conf import settings
+
+_use_replica = contextvars.ContextVar('use_read_replica', default=False)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver applying SQLITE_PRAGMAS to new SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+class ReadReplicaRouter:
+    """Sends reads to the 'replica' database, but only inside ``use_read_replica`` views.
+
+    Everything else, including all writes and migrations, uses 'default',
+    so requests never read stale data right after writing it.
+    """
+
+    def db_for_read(self, model, **hints):
+        # The database cache holds cross-process refresh locks; never read it from a lagging replica
+        if model._meta.app_label == 'django_cache':
+            return None
+        if _use_replica.get() and 'replica' in settings.DATABASES:
+            return 'replica'
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def use_read_replica(view):
+    """Decorator routing a read-only view's queries to the replica, when one is configured"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            response = view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+        if getattr(response, 'streaming', False):
+            # Streamed bodies are generated after the view returns
+            response.streaming_content = _on_replica(response.streaming_content)
+        return response
+
+    return wrapper
+
+
+def _on_replica(iterable):
+    iterator = iter(iterable)
+    while True:
+        token = _use_replica.set(True)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _use_replica.reset(token)
+        yield chunk
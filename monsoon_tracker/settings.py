@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -82,14 +83,65 @@ WSGI_APPLICATION = "monsoon_tracker.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgres for multi-worker deployments; sqlite (the default) is
+# tuned for a single node: WAL journal, busy timeout and memory-mapped reads.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": config('DB_NAME', default='monsoon_tracker'),
+            "USER": config('DB_USER', default='postgres'),
+            "PASSWORD": config('DB_PASSWORD', default=''),
+            "HOST": config('DB_HOST', default='localhost'),
+            "PORT": config('DB_PORT', default='5432'),
+            # Keep connections open between requests, checking them before reuse
+            "CONN_MAX_AGE": config('DB_CONN_MAX_AGE', default=60, cast=int),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "connect_timeout": config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
     }
+
+    # Optional streaming replica for read-only API views (see monsoon_tracker.db)
+    DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+    if DB_REPLICA_HOST:
+        DATABASES["replica"] = {
+            **DATABASES["default"],
+            "HOST": DB_REPLICA_HOST,
+            "PORT": config('DB_REPLICA_PORT', default=DATABASES["default"]["PORT"]),
+            "TEST": {"MIRROR": "default"},
+        }
+        DATABASE_ROUTERS = ['monsoon_tracker.db.ReadReplicaRouter']
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": config('SQLITE_PATH', default=str(BASE_DIR / "db.sqlite3")),
+            "OPTIONS": {
+                # Seconds a writer waits for the database lock before failing
+                "timeout": config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DB_ENGINE {DB_ENGINE!r}, expected 'sqlite' or 'postgres'")
+
+# Applied to every new SQLite connection (monsoon_tracker.db)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    'temp_store': 'memory',
 }
 
 
+# Custom user model (carries city, phone number and notification preferences)
+AUTH_USER_MODEL = 'accounts.CustomUser'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -135,12 +187,188 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 OPENWEATHER_API_KEY = config('OPENWEATHER_API_KEY', default='')
 OPENAQ_API_KEY = config('OPENAQ_API_KEY', default='')
 
+# Batch ingestion
+INGESTION_MAX_WORKERS = config('INGESTION_MAX_WORKERS', default=16, cast=int)
+PROVIDER_CONCURRENCY = {
+    'openweather': config('OPENWEATHER_CONCURRENCY', default=8, cast=int),
+    'openaq': config('OPENAQ_CONCURRENCY', default=4, cast=int),
+}
+# Cities per grouped provider call (OpenWeather's /group accepts at most 20 ids)
+OPENWEATHER_GROUP_MAX = 20
+OPENAQ_GROUP_MAX = config('OPENAQ_GROUP_MAX', default=10, cast=int)
+
+# Pooled HTTP client for external providers (timeouts in seconds). A 429/503
+# Retry-After longer than max_retry_after is cut short to it before retrying.
+PROVIDER_HTTP = {
+    'default': {
+        'connect_timeout': config('PROVIDER_CONNECT_TIMEOUT', default=3.05, cast=float),
+        'read_timeout': config('PROVIDER_READ_TIMEOUT', default=10, cast=float),
+        'retries': config('PROVIDER_RETRIES', default=2, cast=int),
+        'backoff_factor': config('PROVIDER_BACKOFF_FACTOR', default=0.5, cast=float),
+        'max_retry_after': config('PROVIDER_MAX_RETRY_AFTER', default=5, cast=float),
+        'pool_connections': 4,
+    },
+    'openweather': {
+        'read_timeout': config('OPENWEATHER_READ_TIMEOUT', default=10, cast=float),
+    },
+    'openaq': {
+        'read_timeout': config('OPENAQ_READ_TIMEOUT', default=15, cast=float),
+    },
+}
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
 
+# Provider traffic mode: 'live', 'record' (live + save responses to
+# PROVIDER_CASSETTE_DIR) or 'replay' (serve saved responses, no network)
+PROVIDER_HTTP_MODE = config('PROVIDER_HTTP_MODE', default='live')
+PROVIDER_CASSETTE_DIR = config('PROVIDER_CASSETTE_DIR', default=str(BASE_DIR / 'cassettes'))
+PROVIDER_REPLAY = {
+    'latency_ms': config('PROVIDER_REPLAY_LATENCY_MS', default=0, cast=float),
+    'jitter_ms': config('PROVIDER_REPLAY_JITTER_MS', default=0, cast=float),
+    'error_rate': config('PROVIDER_REPLAY_ERROR_RATE', default=0.0, cast=float),
+    'max_rps': config('PROVIDER_REPLAY_MAX_RPS', default=0, cast=float),
+}
+
+# Cache. Refresh locks (cache.add) must be visible to every worker process,
+# so the default is a database table (created by the dashboard migrations)
+# rather than per-process memory; REDIS_URL switches to Redis.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'monsoon_tracker_cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Forecasts are cached until the provider's next 3-hourly run, then served
+# stale for up to FORECAST_CACHE_STALE_SECONDS while one worker refreshes them
+FORECAST_STEP_SECONDS = 3 * 60 * 60
+FORECAST_PUBLISH_DELAY_SECONDS = config('FORECAST_PUBLISH_DELAY_SECONDS', default=300, cast=int)
+FORECAST_CACHE_STALE_SECONDS = config('FORECAST_CACHE_STALE_SECONDS', default=3 * 60 * 60, cast=int)
+
+# Horizons (in days) the views ask for; the scheduler warms all of them with one fetch
+FORECAST_HORIZONS = [3, 7]
+
+# Background refresh scheduler (python manage.py run_scheduler). Once it runs,
+# set FETCH_ON_READ=False so views only read stored data and never call providers.
+FETCH_ON_READ = config('FETCH_ON_READ', default=True, cast=bool)
+REFRESH_INTERVALS = {
+    'weather': config('WEATHER_REFRESH_SECONDS', default=15 * 60, cast=int),
+    'air_quality': config('AIR_QUALITY_REFRESH_SECONDS', default=30 * 60, cast=int),
+    'forecast': config('FORECAST_REFRESH_SECONDS', default=3 * 60 * 60, cast=int),
+}
+SCHEDULER_TICK_SECONDS = config('SCHEDULER_TICK_SECONDS', default=30, cast=int)
+SCHEDULER_ACTIVE_USER_DAYS = config('SCHEDULER_ACTIVE_USER_DAYS', default=30, cast=int)
+
+# How long a request waits for another worker's in-flight refresh of the same city
+REFRESH_WAIT_TIMEOUT = config('REFRESH_WAIT_TIMEOUT', default=10, cast=int)
+
+# Per-worker ring buffers behind the sparkline APIs: how much history they
+# cover, how many readings each city keeps, and how often they pick up
+# readings written by other processes (e.g. the refresh scheduler)
+SPARKLINE_HOURS = 24
+SPARKLINE_CAPACITY = config('SPARKLINE_CAPACITY', default=288, cast=int)
+SPARKLINE_SYNC_SECONDS = config('SPARKLINE_SYNC_SECONDS', default=60, cast=int)
+
+# Rolling rainfall totals (mm) per window at which a city's residents are
+# alerted when the scheduler or ingest_cities stores new readings (never
+# from a page view), at most once per ALERT_FANOUT cooldown.
+# Defaults follow the IMD "very heavy" (24h) and "extremely heavy" (72h) categories.
+RAINFALL_ALERT_THRESHOLDS = {
+    '1h': config('RAINFALL_ALERT_1H_MM', default=30.0, cast=float),
+    '3h': config('RAINFALL_ALERT_3H_MM', default=50.0, cast=float),
+    '24h': config('RAINFALL_ALERT_24H_MM', default=115.6, cast=float),
+    '72h': config('RAINFALL_ALERT_72H_MM', default=204.5, cast=float),
+}
+
+# Spike detection on ingested readings. A reading alerts residents when it is
+# z_threshold standard deviations above its city's weighted average (alpha is
+# the weight of each new reading), once min_samples readings have been seen,
+# it is at least the metric's floor, and the same metric hasn't alerted within
+# cooldown_seconds. min_spread stops near-constant series alerting on noise.
+ANOMALY_DETECTION = {
+    'alpha': config('ANOMALY_ALPHA', default=0.1, cast=float),
+    'z_threshold': config('ANOMALY_Z_THRESHOLD', default=3.0, cast=float),
+    'min_samples': config('ANOMALY_MIN_SAMPLES', default=12, cast=int),
+    'cooldown_seconds': config('ANOMALY_COOLDOWN_SECONDS', default=6 * 60 * 60, cast=int),
+    'floors': {'rainfall': 5.0, 'pressure_drop': 2.0, 'wind_speed': 10.0, 'aqi': 100},
+    'min_spread': {'rainfall': 1.0, 'pressure_drop': 0.5, 'wind_speed': 1.0, 'aqi': 5},
+}
+
+# City-wide alert fan-out: rows per bulk INSERT, and how long an alert with
+# the same dedupe key (e.g. one gauge going critical) is not repeated
+ALERT_FANOUT = {
+    'batch_size': config('ALERT_FANOUT_BATCH_SIZE', default=2000, cast=int),
+    'cooldown_seconds': config('ALERT_FANOUT_COOLDOWN_SECONDS', default=6 * 60 * 60, cast=int),
+}
+
+# Live dashboard stream (/api/dashboard/stream/, served under ASGI): comment
+# interval that keeps idle connections open through proxies, how long one
+# stream lives before the browser reconnects, and the reconnect delay
+SSE_KEEPALIVE_SECONDS = config('SSE_KEEPALIVE_SECONDS', default=15, cast=int)
+SSE_STREAM_SECONDS = config('SSE_STREAM_SECONDS', default=300, cast=int)
+SSE_RETRY_MS = config('SSE_RETRY_MS', default=3000, cast=int)
+
+# Observations older than this many days are moved to compressed monthly
+# archive files by `python manage.py archive_observations`
+OBSERVATION_RETENTION_DAYS = config('OBSERVATION_RETENTION_DAYS', default=90, cast=int)
+OBSERVATION_ARCHIVE_DIR = config('OBSERVATION_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
+# Email, used by the email notification transport. Defaults to writing
+# messages to files under outbox/ so nothing leaves the machine; set
+# EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend to send them.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.filebased.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'outbox' / 'email'))
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='Monsoon Tracker <alerts@localhost>')
+
+# Alert digests (`python manage.py deliver_notifications`): a user's pending
+# alerts are collected into one message once the oldest is window_seconds
+# old, and failed sends are retried with exponential backoff from
+# retry_seconds, up to max_attempts times
+NOTIFICATION_DIGEST = {
+    'window_seconds': config('NOTIFICATION_WINDOW_SECONDS', default=300, cast=int),
+    'max_attempts': config('NOTIFICATION_MAX_ATTEMPTS', default=5, cast=int),
+    'retry_seconds': config('NOTIFICATION_RETRY_SECONDS', default=60, cast=int),
+}
+
+# Delivery transports by name. Each sends queued digests in batches of
+# batch_size, at most rate_per_second messages per second.
+NOTIFICATION_TRANSPORTS = {
+    'email': {
+        'BACKEND': 'apps.dashboard.notifications.EmailTransport',
+        'batch_size': 50,
+        'rate_per_second': config('NOTIFICATION_EMAIL_RATE', default=10.0, cast=float),
+    },
+    # No SMS gateway is wired up yet; messages are appended to a local file
+    'sms': {
+        'BACKEND': 'apps.dashboard.notifications.FileTransport',
+        'recipient_field': 'phone_number',
+        'path': str(BASE_DIR / 'outbox' / 'sms.ndjson'),
+        'max_length': 480,
+        'batch_size': 100,
+        'rate_per_second': config('NOTIFICATION_SMS_RATE', default=5.0, cast=float),
+    },
+}
+
 # Login/Logout URLs
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
@@ -941,14 +941,12 @@ function setupKeyboardShortcuts() {
 
 // Setup real-time updates
 function setupRealTimeUpdates() {
-    // WebSocket connection for real-time updates (if supported)
-    if ('WebSocket' in window) {
-        setupWebSocket();
-    }
-    
-    // Server-sent events fallback
+    // Server-sent events for real-time updates (if supported)
     if ('EventSource' in window) {
         setupServerSentEvents();
+    } else if ('WebSocket' in window) {
+        // WebSocket fallback
+        setupWebSocket();
     }
 }
 
@@ -996,8 +994,11 @@ function setupServerSentEvents() {
         };
         
         eventSource.onerror = function(error) {
-            console.error('SSE error:', error);
-            eventSource.close();
+            // The browser reconnects by itself after the server ends a stream;
+            // it only gives up (CLOSED) when the endpoint is unavailable
+            if (eventSource.readyState === EventSource.CLOSED) {
+                console.warn('SSE unavailable, using periodic refresh');
+            }
         };
         
     } catch (error) {